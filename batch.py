@@ -0,0 +1,52 @@
+import io, multiprocessing, os, time
+from contextlib import redirect_stdout
+import helpers, interpreter, state
+
+prelude : state.Snapshot = None # Compiled once in the parent and inherited by forked workers.
+
+def runJob(path:str) -> dict:
+    """Runs one script on a private copy of the prelude, capturing its output and final stack."""
+    forth = interpreter.Interpreter()
+    forth.restore(prelude)
+    output = io.StringIO()
+    error = None
+    start = time.perf_counter()
+    try:
+        with open(path) as file, redirect_stdout(output):
+            forth.run(helpers.tokenize(file.read()))
+    except Exception as e:
+        error = repr(e)
+    finally:
+        forth.close()
+    return {
+        'file': path,
+        'output': output.getvalue(),
+        'stack': list(forth.interpretState.dataStack),
+        'seconds': time.perf_counter() - start,
+        'error': error,
+    }
+
+def runBatch(directory:str, jobs:int=None, preludeSource:str=''):
+    """
+    Runs every .forth file in directory across a pool of forked workers.
+    Yields one result dict per script, in file name order.
+    """
+    global prelude
+    forth = interpreter.Interpreter()
+    forth.run(helpers.tokenize(preludeSource))
+    prelude = forth.snapshot()
+    paths = sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith('.forth'))
+    with multiprocessing.get_context('fork').Pool(jobs) as pool:
+        yield from pool.imap(runJob, paths)
+
+def report(results) -> None:
+    """Prints each job's output, final stack and timing, then a summary line."""
+    total, count, failed = time.perf_counter(), 0, 0
+    for result in results:
+        count += 1
+        print(f"== {result['file']} ({result['seconds']*1000:.1f} ms) stack: {result['stack']}")
+        print(result['output'], end='')
+        if result['error']:
+            failed += 1
+            print('Error:', result['error'])
+    print(f"== {count} jobs, {failed} failed, {time.perf_counter() - total:.2f} s")
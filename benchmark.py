@@ -0,0 +1,24 @@
+#! /usr/local/bin/python3
+import argparse, os, statistics, subprocess, sys, tempfile, time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def startup(runs:int=20) -> float:
+    """Median wall time in seconds of running pyforth.py on an empty file."""
+    with tempfile.NamedTemporaryFile('w', suffix='.forth') as empty:
+        times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, os.path.join(HERE, 'pyforth.py'), empty.name], check=True)
+            times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='pyforth benchmarks')
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--max-startup-ms', type=float, help='exit with an error if startup is slower than this')
+    args = parser.parse_args()
+    startupMs = startup(args.runs) * 1000
+    print(f'startup: {startupMs:.1f} ms (median of {args.runs})')
+    if args.max_startup_ms is not None and startupMs > args.max_startup_ms:
+        sys.exit(f'startup regressed: {startupMs:.1f} ms > {args.max_startup_ms} ms')
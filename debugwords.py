@@ -0,0 +1,16 @@
+from state import InterpretState
+from primitives import primitive
+
+@primitive("DEBUG")
+def DEBUG(state:InterpretState) -> None:
+    print(state.dataStack, file=state.output)
+    state.pos += 1
+
+@primitive(".MEMO")
+def memoStats(state:InterpretState) -> None:
+    """
+    Prints hits, misses and cached results for every memoized word.
+    """
+    for memo in state.memos:
+        print(f'{memo.name}: {memo.hits} hits, {memo.misses} misses, {len(memo.results)}/{memo.size} cached', file=state.output)
+    state.pos += 1
\ No newline at end of file
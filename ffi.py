@@ -0,0 +1,73 @@
+from __future__ import annotations
+from typing import Callable
+from state import InterpretState, CompileState
+from primitives import primitive, compileTime
+
+def caller(func:Callable, inputs:int, outputs:int) -> Callable:
+    """
+    Builds a function that calls func with the top inputs cells of a data stack and leaves its outputs there.
+    Each stack effect gets its own closure, so no call pays for a shape check.
+    A function with several outputs returns them as a sequence, deepest first.
+    """
+    if inputs == 0:
+        def call(stack):
+            return func()
+    elif inputs == 1:
+        def call(stack):
+            return func(stack.pop())
+    else:
+        def call(stack):
+            args = stack[-inputs:]
+            del stack[-inputs:]
+            return func(*args)
+
+    if outputs == 0:
+        return call
+    if outputs == 1:
+        def push(stack):
+            stack.append(call(stack))
+    else:
+        def push(stack):
+            stack.extend(call(stack))
+    return push
+
+def batchCaller(func:Callable, inputs:int, outputs:int) -> Callable:
+    """
+    Like caller, but for ( x1 .. xn count -- y1 .. yn ), where n is count times the inputs.
+    func is called once with a list of count arguments, a tuple each when inputs isn't 1,
+    and returns an iterable of count results, each a sequence when outputs isn't 1.
+    """
+    def call(stack):
+        count = stack.pop()
+        cells = count * inputs
+        args = stack[len(stack)-cells:]
+        del stack[len(stack)-cells:]
+        if inputs != 1:
+            args = list(zip(*[iter(args)] * inputs))
+        results = func(args)
+        if outputs == 1:
+            stack.extend(results)
+        elif outputs > 1:
+            for result in results:
+                stack.extend(result)
+    return call
+
+def bind(state:CompileState, name:str, func:Callable, inputs:int, outputs:int, batch:bool) -> None:
+    """Makes func callable from Forth as name. Rebinding a name updates the code already compiled against it."""
+    call = (batchCaller if batch else caller)(func, inputs, outputs)
+    if name in state.foreignWords:
+        state.foreign[state.foreignWords[name]] = call
+    else:
+        state.foreignWords[name] = len(state.foreign)
+        state.foreign.append(call)
+    state.dictVersion += 1
+
+@primitive("PYCALL")
+def pyCall(state:InterpretState) -> None:
+    state.foreign[state.codes[state.pos+1]](state.dataStack)
+    state.pos += 2
+
+@compileTime("PYCALL")
+def pyCall(state:CompileState) -> None:
+    """Has no compile-time behavior."""
+    return None
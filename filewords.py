@@ -0,0 +1,170 @@
+import errno
+from state import InterpretState
+from primitives import primitive
+
+FILE_BUFFER_SIZE : int = 64 * 1024 # Buffer size used for files opened with OPEN-FILE and CREATE-FILE.
+
+def fileError(error:OSError) -> int:
+    """Converts an OSError into a non-zero I/O result code (ior)."""
+    return error.errno or -1
+
+def fileOf(state:InterpretState, fileid:int):
+    """The open file for fileid. An unknown fileid raises OSError, so it is reported as an ior like other failures."""
+    file = state.files.get(fileid)
+    if file is None:
+        raise OSError(errno.EBADF, 'fileid is not open')
+    return file
+
+def openFile(state:InterpretState, modes:tuple) -> None:
+    """
+    Shared implementation of OPEN-FILE and CREATE-FILE.
+    ( c-addr u fam -- fileid ior )
+    """
+    fam, u, addr = state.dataStack.pop(), state.dataStack.pop(), state.dataStack.pop()
+    name = state.dataSpace[addr:addr+u].decode()
+    try:
+        file = open(name, modes[fam], buffering=FILE_BUFFER_SIZE)
+    except OSError as error:
+        state.dataStack.extend((0, fileError(error)))
+    else:
+        state.files[file.fileno()] = file
+        state.dataStack.extend((file.fileno(), 0))
+    state.pos += 1
+
+@primitive("R/O")
+def readOnly(state:InterpretState) -> None:
+    """
+    ( -- fam )
+    """
+    state.dataStack.append(0)
+    state.pos += 1
+
+@primitive("W/O")
+def writeOnly(state:InterpretState) -> None:
+    """
+    ( -- fam )
+    """
+    state.dataStack.append(1)
+    state.pos += 1
+
+@primitive("R/W")
+def readWrite(state:InterpretState) -> None:
+    """
+    ( -- fam )
+    """
+    state.dataStack.append(2)
+    state.pos += 1
+
+@primitive("BIN")
+def binary(state:InterpretState) -> None:
+    """
+    ( fam -- fam )
+    Files are always opened in binary mode, so this leaves fam unchanged.
+    """
+    state.pos += 1
+
+@primitive("OPEN-FILE")
+def openFileWord(state:InterpretState) -> None:
+    """
+    ( c-addr u fam -- fileid ior )
+    """
+    openFile(state, ("rb", "r+b", "r+b"))
+
+@primitive("CREATE-FILE")
+def createFile(state:InterpretState) -> None:
+    """
+    ( c-addr u fam -- fileid ior )
+    """
+    openFile(state, ("w+b", "wb", "w+b"))
+
+@primitive("CLOSE-FILE")
+def closeFile(state:InterpretState) -> None:
+    """
+    ( fileid -- ior )
+    """
+    fileid = state.dataStack.pop()
+    try:
+        fileOf(state, fileid).close()
+    except OSError as error:
+        state.dataStack.append(fileError(error))
+    else:
+        state.dataStack.append(0)
+    finally:
+        state.files.pop(fileid, None)
+    state.pos += 1
+
+@primitive("READ-FILE")
+def readFile(state:InterpretState) -> None:
+    """
+    ( c-addr u1 fileid -- u2 ior )
+    Reads straight into the data space without an intermediate bytes object.
+    """
+    fileid, u, addr = state.dataStack.pop(), state.dataStack.pop(), state.dataStack.pop()
+    try:
+        with memoryview(state.dataSpace) as view:
+            count = fileOf(state, fileid).readinto(view[addr:addr+u])
+    except OSError as error:
+        state.dataStack.extend((0, fileError(error)))
+    else:
+        state.dataStack.extend((count, 0))
+    state.pos += 1
+
+@primitive("READ-LINE")
+def readLine(state:InterpretState) -> None:
+    """
+    ( c-addr u1 fileid -- u2 flag ior )
+    """
+    fileid, u, addr = state.dataStack.pop(), state.dataStack.pop(), state.dataStack.pop()
+    try:
+        raw = fileOf(state, fileid).readline(u)
+    except OSError as error:
+        state.dataStack.extend((0, 0, fileError(error)))
+    else:
+        line = raw.rstrip(b"\r\n")
+        state.dataSpace[addr:addr+len(line)] = line
+        state.dataStack.extend((len(line), -1 if raw or u == 0 else 0, 0))
+    state.pos += 1
+
+@primitive("WRITE-FILE")
+def writeFile(state:InterpretState) -> None:
+    """
+    ( c-addr u fileid -- ior )
+    """
+    fileid, u, addr = state.dataStack.pop(), state.dataStack.pop(), state.dataStack.pop()
+    try:
+        with memoryview(state.dataSpace) as view:
+            fileOf(state, fileid).write(view[addr:addr+u])
+    except OSError as error:
+        state.dataStack.append(fileError(error))
+    else:
+        state.dataStack.append(0)
+    state.pos += 1
+
+@primitive("WRITE-LINE")
+def writeLine(state:InterpretState) -> None:
+    """
+    ( c-addr u fileid -- ior )
+    """
+    fileid, u, addr = state.dataStack.pop(), state.dataStack.pop(), state.dataStack.pop()
+    try:
+        with memoryview(state.dataSpace) as view:
+            fileOf(state, fileid).write(view[addr:addr+u])
+        fileOf(state, fileid).write(b"\n")
+    except OSError as error:
+        state.dataStack.append(fileError(error))
+    else:
+        state.dataStack.append(0)
+    state.pos += 1
+
+@primitive("FLUSH-FILE")
+def flushFile(state:InterpretState) -> None:
+    """
+    ( fileid -- ior )
+    """
+    try:
+        fileOf(state, state.dataStack.pop()).flush()
+    except OSError as error:
+        state.dataStack.append(fileError(error))
+    else:
+        state.dataStack.append(0)
+    state.pos += 1
\ No newline at end of file
@@ -0,0 +1,117 @@
+import math, struct
+from state import InterpretState, CompileState
+from primitives import primitive, compileTime
+
+def fpop(state:InterpretState) -> float:
+    """Pops the top of the float stack."""
+    if state.floatDepth == 0:
+        raise IndexError('pop from empty float stack')
+    state.floatDepth -= 1
+    return state.floatStack[state.floatDepth]
+
+def fpush(state:InterpretState, value:float) -> None:
+    """Pushes a value onto the preallocated float stack."""
+    state.floatStack[state.floatDepth] = value
+    state.floatDepth += 1
+
+@primitive("FPUSH")
+def fpushLiteral(state:InterpretState) -> None:
+    fpush(state, state.codes[state.pos+1])
+    state.pos += 2
+
+@compileTime("FPUSH")
+def fpushLiteral(state:CompileState) -> None:
+    """Has no compile-time behavior."""
+    return None
+
+@primitive("F+")
+def fPlus(state:InterpretState) -> None:
+    """
+    ( F: r1 r2 -- r3 )
+    """
+    a, b = fpop(state), fpop(state)
+    fpush(state, b + a)
+    state.pos += 1
+
+@primitive("F-")
+def fMinus(state:InterpretState) -> None:
+    """
+    ( F: r1 r2 -- r3 )
+    """
+    a, b = fpop(state), fpop(state)
+    fpush(state, b - a)
+    state.pos += 1
+
+@primitive("F*")
+def fStar(state:InterpretState) -> None:
+    """
+    ( F: r1 r2 -- r3 )
+    """
+    a, b = fpop(state), fpop(state)
+    fpush(state, b * a)
+    state.pos += 1
+
+@primitive("F/")
+def fSlash(state:InterpretState) -> None:
+    """
+    ( F: r1 r2 -- r3 )
+    """
+    a, b = fpop(state), fpop(state)
+    fpush(state, b / a)
+    state.pos += 1
+
+@primitive("FSQRT")
+def fSqrt(state:InterpretState) -> None:
+    """
+    ( F: r1 -- r2 )
+    """
+    fpush(state, math.sqrt(fpop(state)))
+    state.pos += 1
+
+@primitive("F@")
+def fFetch(state:InterpretState) -> None:
+    """
+    ( f-addr -- ) ( F: -- r )
+    """
+    fpush(state, struct.unpack_from('d', state.dataSpace, state.dataStack.pop())[0])
+    state.pos += 1
+
+@primitive("F!")
+def fStore(state:InterpretState) -> None:
+    """
+    ( f-addr -- ) ( F: r -- )
+    """
+    struct.pack_into('d', state.dataSpace, state.dataStack.pop(), fpop(state))
+    state.pos += 1
+
+@primitive("FLOATS")
+def floats(state:InterpretState) -> None:
+    """
+    ( n1 -- n2 )
+    """
+    state.dataStack.append(state.dataStack.pop() * 8)
+    state.pos += 1
+
+@primitive("F.")
+def fPeriod(state:InterpretState) -> None:
+    """
+    ( F: r -- )
+    """
+    print(fpop(state), end='\n', file=state.output)
+    state.pos += 1
+
+@primitive("S>F")
+def sToF(state:InterpretState) -> None:
+    """
+    ( n -- ) ( F: -- r )
+    """
+    fpush(state, state.dataStack.pop())
+    state.pos += 1
+
+@primitive("F>S")
+def fToS(state:InterpretState) -> None:
+    """
+    ( -- n ) ( F: r -- )
+    """
+    state.dataStack.append(int(fpop(state)))
+    state.pos += 1
\ No newline at end of file
@@ -0,0 +1,235 @@
+#! /usr/local/bin/python3
+"""
+Differential fuzzing: runs random well-formed programs under every interpreter configuration
+and reports any that end with a different stack, variables, output or error than the reference.
+"""
+import argparse, asyncio, copy, io, random, sys, time
+import helpers, interpreter
+
+VARIABLES : int = 2
+MAX_WORDS : int = 4
+MAX_STATEMENTS : int = 8
+MAX_NESTING : int = 2
+MAX_LOOP_COUNT : int = 4
+
+BINARY = ('+', '-', '*', 'AND', 'OR', '<', '>', '=')
+SHUFFLES = {'DUP': (1, 1), 'DROP': (1, -1), 'SWAP': (2, 0), 'OVER': (2, 1), 'ROT': (3, 0),
+            '2SWAP': (4, 0), '2OVER': (4, 2), '2DROP': (2, -2), 'INVERT': (1, 0)} # Depth needed and change.
+
+# Name, Interpreter options, how the program is run, and whether its words are memoized.
+CONFIGS = (
+    ('reference', {}, 'run', False),
+    ('optimize', {'optimize': True}, 'run', False),
+    ('late-binding', {'lateBinding': True}, 'run', False),
+    ('optimize+late-binding', {'optimize': True, 'lateBinding': True}, 'run', False),
+    ('metrics', {'metrics': True}, 'run', False),
+    ('memo', {}, 'run', True),
+    ('async', {}, 'async', False),
+    ('optimize+shaken', {'optimize': True}, 'shake', False),
+    ('optimize+evaluate', {'optimize': True}, 'evaluate', False),
+)
+EVALUATED : str = '0 DUP DROP DROP' # Snippet evaluate runs on the final stack, which it must leave as it was.
+
+class Generator:
+    """
+    Builds random programs that never underflow. A body is a list of statements: a list of tokens,
+    ('IF', then, else) or ('DO', count, body). Every branch of an IF leaves the same depth,
+    and loop bodies leave the depth unchanged.
+    """
+    def __init__(self, rng:random.Random):
+        self.rng = rng
+        self.words = [] # (name, inputs, outputs) of the words defined so far.
+
+    def program(self) -> dict:
+        words = []
+        for index in range(self.rng.randint(0, MAX_WORDS)):
+            inputs, outputs = self.rng.randint(0, 2), self.rng.randint(0, 2)
+            words.append((f'W{index}', inputs, outputs, self.body(inputs, outputs, 0, False)))
+            self.words.append((f'W{index}', inputs, outputs))
+        return {'words': words, 'main': self.body(0, self.rng.randint(0, 3), 0, False)}
+
+    def body(self, depth:int, target:int, nesting:int, inLoop:bool) -> list:
+        statements = []
+        for _ in range(self.rng.randint(1, MAX_STATEMENTS)):
+            statement, depth = self.statement(depth, nesting, inLoop)
+            statements.append(statement)
+        while depth > target:
+            statements.append(['+'] if depth > target + 1 and self.rng.random() < 0.5 else ['DROP'])
+            depth -= 1
+        while depth < target:
+            statements.append([str(self.rng.randint(-9, 99))])
+            depth += 1
+        return statements
+
+    def statement(self, depth:int, nesting:int, inLoop:bool) -> tuple:
+        rng = self.rng
+        choices = ['literal']
+        if depth >= 1:
+            choices += ['shuffle', 'divide', 'print', 'store']
+        if depth >= 2:
+            choices += ['binary', 'binary']
+        if inLoop:
+            choices.append('index')
+        if nesting < MAX_NESTING:
+            choices += ['loop'] + (['if'] if depth >= 1 else [])
+        choices += ['fetch'] + (['call'] if self.words else [])
+        kind = rng.choice(choices)
+        if kind == 'literal':
+            return [str(rng.randint(-9, 99))], depth + 1
+        if kind == 'binary':
+            return [rng.choice(BINARY)], depth - 1
+        if kind == 'divide':
+            # Usually a safe divisor, sometimes zero so division errors are compared too.
+            return [str(rng.choice((0, 1, 2, 3, 7)) if rng.random() < 0.1 else rng.randint(1, 9)), rng.choice(('/', 'MOD'))], depth
+        if kind == 'shuffle':
+            word = rng.choice([word for word, (needed, _) in SHUFFLES.items() if depth >= needed])
+            return [word], depth + SHUFFLES[word][1]
+        if kind == 'print':
+            return ['.'], depth - 1
+        if kind == 'store':
+            return [f'V{rng.randrange(VARIABLES)}', '@'], depth - 1
+        if kind == 'fetch':
+            return [f'V{rng.randrange(VARIABLES)}', '!'], depth + 1
+        if kind == 'index':
+            return ['I'], depth + 1
+        if kind == 'call':
+            name, inputs, outputs = rng.choice(self.words)
+            if depth < inputs:
+                return [str(rng.randint(0, 9))], depth + 1
+            return [name], depth - inputs + outputs
+        if kind == 'loop':
+            return ('DO', rng.randint(0, MAX_LOOP_COUNT), self.body(depth, depth, nesting + 1, True)), depth
+        target = max(0, depth - 1 + rng.randint(-1, 1))
+        hasElse = rng.random() < 0.6
+        then = self.body(depth - 1, target if hasElse else depth - 1, nesting + 1, inLoop)
+        other = self.body(depth - 1, target, nesting + 1, inLoop) if hasElse else None
+        return ('IF', then, other), target if hasElse else depth - 1
+
+def render(body:list) -> list:
+    tokens = []
+    for statement in body:
+        if isinstance(statement, list):
+            tokens.extend(statement)
+        elif statement[0] == 'IF':
+            tokens += ['IF'] + render(statement[1]) + (['ELSE'] + render(statement[2]) if statement[2] is not None else []) + ['THEN']
+        else:
+            tokens += [str(statement[1]), '0', 'DO'] + render(statement[2]) + ['LOOP']
+    return tokens
+
+def source(program:dict, memo:bool=False) -> str:
+    tokens = []
+    for index in range(VARIABLES):
+        tokens += ['VARIABLE', f'V{index}']
+    for name, inputs, outputs, body in program['words']:
+        tokens += [':', name] + render(body) + [';']
+        if memo:
+            tokens += ['MEMO', '('] + ['n'] * inputs + ['--'] + ['n'] * outputs + [')']
+    return ' '.join(tokens + render(program['main']))
+
+def execute(program:dict, options:dict, mode:str, memo:bool) -> tuple:
+    """Runs a program in one configuration. Returns its outcome and how long it took."""
+    forth = interpreter.Interpreter(**options)
+    forth.interpretState.output = io.StringIO() # Compiler messages, such as MEMO refusing an impure word.
+    output = io.StringIO()
+    tokens = helpers.tokenize(source(program, memo))
+    error = None
+    start = time.perf_counter()
+    try:
+        forth.compile(forth.compileState, tokens)
+        if mode == 'shake':
+            image, _ = forth.shake()
+            forth.restore(image)
+        forth.interpretState.output = output
+        if mode == 'async':
+            asyncio.run(forth.runAsync([], sliceSize=7))
+        else:
+            forth.run([])
+        if mode == 'evaluate':
+            # Compiled after the top-level code that just ran, as a service evaluating requests would.
+            forth.interpretState.dataStack = forth.evaluate(EVALUATED, forth.interpretState.dataStack)
+    except Exception as e:
+        error = type(e).__name__
+    seconds = time.perf_counter() - start
+    state = forth.interpretState
+    if error is not None:
+        # Stacks are left mid-instruction after an error, so only what was printed must agree.
+        return (output.getvalue(), error), seconds
+    return (output.getvalue(), list(state.dataStack), list(state.variables[:VARIABLES]), None), seconds
+
+def divergence(program:dict, configs=CONFIGS):
+    """Name and outcome of the first configuration that disagrees with the reference, or None."""
+    expected, _ = execute(program, *configs[0][1:])
+    for name, options, mode, memo in configs[1:]:
+        outcome, _ = execute(program, options, mode, memo)
+        if outcome != expected:
+            return name, expected, outcome
+    return None
+
+def bodies(program:dict):
+    """Every statement list in the program, innermost included."""
+    pending = [program['main']] + [word[3] for word in program['words']]
+    while pending:
+        body = pending.pop()
+        yield body
+        for statement in body:
+            if isinstance(statement, tuple):
+                pending.extend(part for part in statement[1:] if isinstance(part, list))
+
+def candidates(program:dict):
+    """Copies of program with one word or one statement removed."""
+    for index in range(len(program['words'])):
+        candidate = copy.deepcopy(program)
+        del candidate['words'][index]
+        yield candidate
+    for path, body in enumerate(list(bodies(program))):
+        for index in range(len(body)):
+            candidate = copy.deepcopy(program)
+            del list(bodies(candidate))[path][index]
+            yield candidate
+
+def shrink(program:dict, configs=CONFIGS) -> dict:
+    """Removes words and statements one at a time for as long as the program still diverges."""
+    while True:
+        for candidate in candidates(program):
+            if divergence(candidate, configs):
+                program = candidate
+                break
+        else:
+            return program
+
+def fuzz(programs:int, seed:int, configs=CONFIGS) -> int:
+    """Runs the campaign, printing any minimized divergences and the speed of each configuration."""
+    rng = random.Random(seed)
+    times = {name: 0.0 for name, *_ in configs}
+    failures = 0
+    for number in range(programs):
+        program = Generator(rng).program()
+        expected = None
+        for name, options, mode, memo in configs:
+            outcome, seconds = execute(program, options, mode, memo)
+            times[name] += seconds
+            if expected is None:
+                expected = outcome
+            elif outcome != expected:
+                failures += 1
+                small = shrink(program, configs)
+                _, want, got = divergence(small, configs) or (name, expected, outcome)
+                print(f'== program {number}: {name} differs from {configs[0][0]}')
+                print(source(small))
+                print(f'   expected {want}')
+                print(f'   got      {got}')
+                break
+    reference = times[configs[0][0]] or 1e-9
+    for name, seconds in times.items():
+        print(f'{name:<24} {seconds:8.3f} s  {seconds / reference:5.2f}x')
+    print(f'== {programs} programs, {failures} divergent')
+    return failures
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Differential fuzzing of pyforth configurations')
+    parser.add_argument('--programs', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--config', action='append', help='configurations to compare with the reference (default: all)')
+    args = parser.parse_args()
+    configs = CONFIGS if not args.config else (CONFIGS[0],) + tuple(c for c in CONFIGS if c[0] in args.config)
+    sys.exit(1 if fuzz(args.programs, args.seed, configs) else 0)
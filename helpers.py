@@ -1,8 +1,24 @@
 from typing import List
 
+STRING_WORDS = ('S"', '."', 'C"') # Words whose argument is the text up to the next double quote.
+
 def tokenize(code:str) -> List[str]:
+    if '"' not in code:
+        return code.split()
+    import re
+    pattern = re.compile(r'\S+')
     tokensOut : List[str] = []
-    tokensOut = code.split()
+    pos = 0
+    while match := pattern.search(code, pos):
+        tokensOut.append(match.group())
+        pos = match.end()
+        if match.group() in STRING_WORDS:
+            # Keep the literal as one token, skipping the single space that delimits it.
+            end = code.find('"', pos + 1)
+            if end == -1:
+                end = len(code)
+            tokensOut.append(code[pos+1:end])
+            pos = end + 1
     return tokensOut
 
 def isInt(lexeme:str) -> bool:
@@ -10,4 +26,13 @@ def isInt(lexeme:str) -> bool:
             int(lexeme)
         except ValueError:
             return False
-        return True
\ No newline at end of file
+        return True
+
+def isFloat(lexeme:str) -> bool:
+    if not any(c.isdigit() for c in lexeme) or not any(c in '.eE' for c in lexeme):
+        return False
+    try:
+        float(lexeme)
+    except ValueError:
+        return False
+    return True
\ No newline at end of file
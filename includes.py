@@ -0,0 +1,140 @@
+import hashlib, os, pickle
+from dataclasses import dataclass, field
+from helpers import tokenize
+from state import CompileState
+from primitives import Primitives, compileTime, loadWordSets
+
+CACHE_DIR : str = '__forthcache__' # Created next to each included file, like __pycache__.
+INCLUDE_END : str = 'END OF INCLUDE' # Token appended after an included file's tokens. It can't be typed.
+DICTIONARIES = ('words', 'variables', 'strings', 'memoized', 'deferred', 'bindings', 'foreignWords', 'included')
+
+@dataclass
+class IncludeFrame:
+    """A file whose tokens are being compiled. Its result is cached when INCLUDE_END is reached."""
+    path: str
+    cachePath: str
+    codeStart: int
+    dataStart: int
+    memoStart: int
+    blockStart: int
+    slots: list # The slot table before the file, to tell which slots it appended or repointed.
+    dictVersion: int
+    dependencies: list = field(default_factory=list) # (path, digest) of files it included.
+
+def digestOf(path:str) -> str:
+    with open(path, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+def fingerprint(state:CompileState) -> str:
+    """
+    Hashes everything an included file's compiled code can depend on: where it starts
+    in the code, data and variable spaces, and which names are already defined.
+    """
+    context = (len(state.codes), len(state.dataSpace), len(state.slots), len(state.memos), len(state.blocks),
+               tuple(state.branchStack), state.lateBinding, state.optimize, state.latest, state.last_return, sorted(state.included),
+               *(sorted(getattr(state, name).items()) for name in DICTIONARIES if name != 'included'))
+    return hashlib.sha256(repr(context).encode()).hexdigest()
+
+def include(state:CompileState, path:str) -> None:
+    """
+    Compiles a file in place of the INCLUDE that names it, reusing the cached result
+    when neither the file, the files it includes, nor the dictionary before it changed.
+    """
+    path = os.path.realpath(path)
+    with open(path, 'rb') as file:
+        source = file.read()
+    digest = hashlib.sha256(source).hexdigest()
+    key = hashlib.sha256((digest + fingerprint(state)).encode()).hexdigest()
+    cachePath = os.path.join(os.path.dirname(path), CACHE_DIR, f'{os.path.basename(path)}.{key[:32]}.pickle')
+    state.included[path] = digest
+    if state.includeFrames:
+        state.includeFrames[-1].dependencies.append((path, digest))
+    if load(state, cachePath):
+        return
+    state.includeFrames.append(IncludeFrame(path, cachePath, len(state.codes), len(state.dataSpace),
+                                            len(state.memos), len(state.blocks), list(state.slots), state.dictVersion))
+    state.tokens[state.pos+1:state.pos+1] = tokenize(source.decode()) + [INCLUDE_END]
+
+def load(state:CompileState, cachePath:str) -> bool:
+    try:
+        with open(cachePath, 'rb') as file:
+            entry = pickle.load(file)
+        if any(digestOf(path) != digest for path, digest in entry['dependencies']):
+            return False
+    except (OSError, pickle.PickleError, EOFError):
+        return False
+    loadWordSets(entry['codes'])
+    state.codes.extend(entry['codes'])
+    state.dataSpace.extend(entry['data'])
+    state.memos.extend(entry['memos'])
+    state.blocks.extend(entry['blocks'])
+    # Only the file's own slot changes are replayed, so IS assignments made before it are kept.
+    for index, target in entry['repointed'].items():
+        state.slots[index] = target
+    state.slots.extend(entry['slots'])
+    for name in DICTIONARIES:
+        getattr(state, name).update(entry[name])
+    state.latest, state.last_return = entry['latest'], entry['last_return']
+    state.dictVersion += entry['dictVersion']
+    if state.includeFrames:
+        state.includeFrames[-1].dependencies.extend(entry['dependencies'])
+    return True
+
+def finish(state:CompileState) -> None:
+    """Saves what the innermost included file compiled to, keyed as computed by include()."""
+    frame = state.includeFrames.pop()
+    entry = {
+        'codes': state.codes[frame.codeStart:],
+        'data': bytes(state.dataSpace[frame.dataStart:]),
+        'memos': state.memos[frame.memoStart:],
+        'blocks': state.blocks[frame.blockStart:],
+        'slots': state.slots[len(frame.slots):],
+        'repointed': {index: target for index, target in enumerate(state.slots[:len(frame.slots)]) if target != frame.slots[index]},
+        'latest': state.latest,
+        'last_return': state.last_return,
+        'dictVersion': state.dictVersion - frame.dictVersion,
+        'dependencies': frame.dependencies,
+        **{name: getattr(state, name) for name in DICTIONARIES},
+    }
+    if state.includeFrames:
+        state.includeFrames[-1].dependencies.extend(frame.dependencies)
+    try:
+        os.makedirs(os.path.dirname(frame.cachePath), exist_ok=True)
+        with open(frame.cachePath, 'wb') as file:
+            pickle.dump(entry, file)
+    except OSError:
+        pass
+
+def includePath(state:CompileState) -> str:
+    """Reads the file name after INCLUDE or REQUIRE, relative to the file being included."""
+    state.pos += 1
+    name = state.tokens[state.pos]
+    if state.includeFrames:
+        return os.path.join(os.path.dirname(state.includeFrames[-1].path), name)
+    return name
+
+@compileTime("INCLUDE")
+def includeWord(state:CompileState) -> None:
+    """
+    Compiles another source file here. Compiled files are cached in __forthcache__.
+    """
+    path = includePath(state)
+    try:
+        include(state, path)
+    except OSError as error:
+        print('Cannot include', path, '-', error.strerror, file=state.output)
+
+@compileTime("REQUIRE")
+def requireWord(state:CompileState) -> None:
+    """
+    Like INCLUDE, but does nothing if the file was already included.
+    """
+    path = includePath(state)
+    if os.path.realpath(path) in state.included:
+        return
+    try:
+        include(state, path)
+    except OSError as error:
+        print('Cannot include', path, '-', error.strerror, file=state.output)
+
+Primitives[INCLUDE_END] = {"compile": finish, "execute": None}
\ No newline at end of file
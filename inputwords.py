@@ -0,0 +1,59 @@
+from state import InterpretState
+from primitives import primitive
+
+INPUT_BUFFER_SIZE : int = 1024 # Bytes of data space allotted for the line REFILL reads. Longer lines are cut short.
+
+def inputOf(state:InterpretState):
+    """The interpreter's input source, switching from bare getch to a buffered terminal source on first use."""
+    if state.input is None:
+        from streams import TerminalInput
+        state.input = TerminalInput()
+    return state.input
+
+@primitive("KEY?")
+def keyQuestion(state:InterpretState) -> None:
+    """
+    ( -- flag )
+    True when a character is available, so KEY would not wait.
+    """
+    state.dataStack.append(-1 if inputOf(state).ready() else 0)
+    state.pos += 1
+
+@primitive("ACCEPT")
+def accept(state:InterpretState) -> None:
+    """
+    ( c-addr +n1 -- +n2 )
+    Reads a line of at most n1 characters into data space. Characters beyond n1 are discarded.
+    """
+    line = inputOf(state).readLine() or b''
+    n1, addr = state.dataStack.pop(), state.dataStack.pop()
+    line = line[:n1]
+    state.dataSpace[addr:addr+len(line)] = line
+    state.dataStack.append(len(line))
+    state.pos += 1
+
+@primitive("REFILL")
+def refill(state:InterpretState) -> None:
+    """
+    ( -- flag )
+    Reads the next line of input into the input buffer. False at the end of input.
+    """
+    line = inputOf(state).readLine()
+    if state.inputBuffer is None:
+        state.inputBuffer = len(state.dataSpace)
+        state.dataSpace.extend(bytes(INPUT_BUFFER_SIZE))
+    flag = 0 if line is None else -1
+    line = (line or b'')[:INPUT_BUFFER_SIZE]
+    state.dataSpace[state.inputBuffer:state.inputBuffer+len(line)] = line
+    state.inputLength = len(line)
+    state.dataStack.append(flag)
+    state.pos += 1
+
+@primitive("SOURCE")
+def source(state:InterpretState) -> None:
+    """
+    ( -- c-addr u )
+    The line read by the last REFILL.
+    """
+    state.dataStack.extend((state.inputBuffer or 0, state.inputLength))
+    state.pos += 1
@@ -1,18 +1,187 @@
-from state import InterpretState, CompileState
-from primitives import Primitives
-from helpers import isInt
+from state import InterpretState, CompileState, Snapshot, SHARED_FIELDS
+from primitives import Primitives, isPrimitive, loadWordSets
+from helpers import isInt, isFloat, tokenize
+from streams import InputPending
+from time import perf_counter
+
+class ExecutionLimit(Exception):
+    """Raised when a run exceeds its instruction budget or deadline."""
+
+class FuelExhausted(ExecutionLimit):
+    pass
+
+class DeadlineExceeded(ExecutionLimit):
+    pass
 
 class Interpreter:
-    def __init__(self):
-        self.compileState = CompileState()
-        self.interpretState = InterpretState()
+    def __init__(self, lateBinding=False, metrics=False, optimize=False, snippetCacheSize=None, memoryProfile=False):
+        self.compileState = CompileState(lateBinding=lateBinding, optimize=optimize)
+        self.interpretState = InterpretState(**{name: getattr(self.compileState, name) for name in SHARED_FIELDS})
+        self.snippetCacheSize = snippetCacheSize
+        self.snippets = None # snippets.SnippetCache, created by the first evaluate.
+        self.memoryProfile = None
+        if memoryProfile:
+            from memprofile import MemoryProfile
+            self.memoryProfile = MemoryProfile(self.compileState)
+        self.metrics = None
+        if metrics:
+            from metrics import Metrics
+            self.metrics = Metrics()
+            self.countOutput()
     
-    def run(self, tokens): self.compile(self.compileState, tokens)
+    def run(self, tokens):
+        if self.metrics is not None:
+            return self.runCounted(tokens)
+        if self.memoryProfile is not None:
+            self.compile(self.compileState, tokens)
+            return self.interpretProfiled(self.interpretState, self.compileState.codes, len(self.compileState.variables), self.compileState.last_return)
+        self.compile(self.compileState, tokens)
+        self.interpret(self.interpretState, self.compileState.codes, len(self.compileState.variables), self.compileState.last_return)
+
+    def runCounted(self, tokens):
+        started = perf_counter()
+        self.compile(self.compileState, tokens)
+        compiled = perf_counter()
+        try:
+            self.interpretCounted(self.interpretState, self.compileState.codes, len(self.compileState.variables), self.compileState.last_return)
+        finally:
+            self.metrics.runs += 1
+            self.metrics.compileSeconds += compiled - started
+            self.metrics.runSeconds += perf_counter() - compiled
+
+    def countOutput(self):
+        from metrics import CountingOutput
+        output = self.interpretState.output
+        if isinstance(output, CountingOutput):
+            if output.metrics is self.metrics:
+                return
+            output = output.stream # Restored from another interpreter's snapshot.
+        self.interpretState.output = CountingOutput(self.metrics, output)
+
+    def metricValues(self) -> dict:
+        """Current counters and gauges, keyed by metric name. Requires metrics=True."""
+        from metrics import collect
+        return collect(self.metrics, self.compileState, self.interpretState)
+
+    def dumpMetrics(self, path, format=None):
+        """Writes metricValues to path, as JSON for .json paths or format='json', otherwise in Prometheus text format."""
+        from metrics import dump
+        dump(self.metricValues(), path, format)
+
+    async def runAsync(self, tokens, sliceSize=1000, fuel=None, timeout=None, io=None):
+        """
+        Like run, but yields to the event loop every sliceSize instructions.
+        fuel caps the number of instructions and timeout the wall-clock seconds for this run.
+        io is an adapter such as streams.AsyncStreamIO used for KEY and printing.
+        """
+        started = perf_counter()
+        self.compile(self.compileState, tokens)
+        compiled = perf_counter()
+        if io is not None:
+            self.interpretState.input = self.interpretState.output = io
+            if self.metrics is not None:
+                self.countOutput()
+        try:
+            await self.interpretAsync(self.interpretState, self.compileState.codes, len(self.compileState.variables),
+                                      self.compileState.last_return, sliceSize, fuel, timeout)
+        finally:
+            if self.metrics is not None:
+                self.metrics.runs += 1
+                self.metrics.compileSeconds += compiled - started
+                self.metrics.runSeconds += perf_counter() - compiled
+
+    def runPipelined(self, lines):
+        """
+        Runs source given as an iterable of lines, such as an open file, one segment at a time:
+        each colon definition, and the top-level code between definitions, is run as soon as it is
+        compiled while a producer thread reads and tokenizes what follows. Unlike run, top-level code
+        placed before a later definition is executed, as it is when typed line by line.
+        """
+        from pipeline import runPipelined
+        runPipelined(self, lines)
+
+    def evaluate(self, source, inputs=()) -> list:
+        """
+        Runs source with inputs on an empty data stack and returns the stack it leaves. Nothing is printed.
+        Compiled snippets are cached by source text until a word or variable is defined.
+        """
+        from snippets import SnippetCache, NullOutput
+        from primitives import runWord
+        if self.snippets is None:
+            self.snippets = SnippetCache() if self.snippetCacheSize is None else SnippetCache(self.snippetCacheSize)
+        compileState, state = self.compileState, self.interpretState
+        address = self.snippets.lookup(source, compileState.dictVersion)
+        if address is None:
+            tokens = tokenize(source)
+            if ':' in tokens:
+                raise ValueError('evaluate cannot define words, use run')
+            # The snippet is compiled like a nameless colon definition, so top-level code never runs it.
+            address = len(compileState.codes) - 1 if compileState.codes else 0
+            compileState.definitionStart = address
+            self.compile(compileState, tokens + [';'])
+            self.snippets.store(source, compileState.dictVersion, address)
+
+        state.codes = compileState.codes
+        state.variables.extend([0] * (len(compileState.variables) - len(state.variables)))
+        dataStack, output, pos, depth = state.dataStack, state.output, state.pos, len(state.branchStack)
+        state.dataStack, state.output = list(inputs), NullOutput()
+        try:
+            runWord(state, address)
+            return state.dataStack
+        finally:
+            state.dataStack, state.output, state.pos = dataStack, output, pos
+            del state.branchStack[depth:]
+
+    def bind(self, name, func, inputs=0, outputs=0, batch=False):
+        """
+        Makes the Python function func callable from Forth as name, with the stack effect
+        ( x1 .. xinputs -- y1 .. youtputs ). With batch=True the word takes a count on top and
+        func is called once for count sets of arguments; see ffi.batchCaller.
+        """
+        from ffi import bind
+        bind(self.compileState, name, func, inputs, outputs, batch)
+
+    def snapshot(self) -> Snapshot:
+        return Snapshot.capture(self.compileState, self.interpretState)
+
+    def restore(self, snapshot: Snapshot):
+        # Open files survive a restore, everything else goes back to the snapshot.
+        files = self.interpretState.files
+        self.compileState, self.interpretState = snapshot.restore()
+        loadWordSets(self.compileState.codes)
+        self.interpretState.files = files
+        self.snippets = None # Its addresses may point at code the snapshot doesn't have.
+        if self.metrics is not None:
+            self.countOutput()
+        if self.memoryProfile is not None:
+            self.memoryProfile.compileState = self.compileState
+            self.memoryProfile.dictVersion = -1
+
+    def shake(self, roots=()):
+        """
+        Returns a Snapshot of a minimal program: only the code reachable from top-level code that
+        hasn't run yet and from the words named in roots. Also returns a shake.ShakeReport.
+        """
+        from shake import shake
+        return shake(self.compileState, self.interpretState, roots)
+
+    def clone(self, snapshot: Snapshot = None):
+        forth = Interpreter(metrics=self.metrics is not None)
+        forth.restore(snapshot or self.snapshot())
+        return forth
+
+    def close(self):
+        # Close any files the Forth program left open.
+        for file in self.interpretState.files.values():
+            file.close()
+        self.interpretState.files.clear()
 
     def compile(self, state:CompileState, tokens):
+        state.output = self.interpretState.output
         state.tokens.extend(tokens)
         if state.codes:
             state.codes.pop()
+        state.compileStart = len(state.codes)
         state.end = False
 
         while not state.end:
@@ -24,23 +193,161 @@ class Interpreter:
             token = state.tokens[state.pos]
             if isInt(token):
                 state.codes.extend(('PUSH', int(token)))
-            elif token in Primitives:
+            elif isFloat(token):
+                isPrimitive('FPUSH') # Imports the float word set.
+                state.codes.extend(('FPUSH', float(token)))
+            elif isPrimitive(token):
                 Primitives[token]['compile'](state)
+            elif token in state.foreignWords:
+                state.codes.extend(('PYCALL', state.foreignWords[token]))
             elif token in state.variables:
                 state.codes.extend(('PUSH', state.variables[token]))
+            elif token in state.deferred:
+                state.codes.extend(('DEFERCALL', state.deferred[token]))
+            elif token in state.memoized:
+                state.codes.extend(('MEMOCALL', state.memoized[token]))
+            elif token in state.bindings:
+                state.codes.extend(('DEFERCALL', state.bindings[token]))
             elif token in state.words:
                 state.codes.extend(('CALL', state.words[token]))
             else:
-                print('Unknown word:', token)
+                print('Unknown word:', token, file=state.output)
             state.pos += 1
-        self.interpret(self.interpretState, state.codes, len(state.variables), state.last_return)
 
-    def interpret(self, state: InterpretState, codes, var_count, start):
+    def resume(self, state: InterpretState, codes, var_count, start):
         state.codes = codes
         state.variables.extend([0] * (var_count - len(state.variables)))
         state.pos = max(start, state.pos)
         state.end = False
 
-        while not state.end:
-            code = state.codes[state.pos]
-            Primitives[code]['execute'](state)
\ No newline at end of file
+    def interpret(self, state: InterpretState, codes, var_count, start):
+        self.resume(state, codes, var_count, start)
+
+        task = state
+        while True:
+            while not task.end:
+                code = task.codes[task.pos]
+                Primitives[code]['execute'](task)
+            if task is state and not task.paused:
+                break
+            task = task.scheduler.switch(task)
+
+    def interpretCounted(self, state: InterpretState, codes, var_count, start):
+        # Same loop as interpret with counters kept in locals, written back once at the end.
+        # Each instruction is also reported to the memory profile, if there is one.
+        from metrics import CALL_CODES
+        self.resume(state, codes, var_count, start)
+        metrics, profile = self.metrics, self.memoryProfile
+        instructions = calls = 0
+        dataHigh, returnHigh = metrics.dataStackHighWater, metrics.returnStackHighWater
+
+        task = state
+        try:
+            while True:
+                while not task.end:
+                    pos = task.pos
+                    code = task.codes[pos]
+                    Primitives[code]['execute'](task)
+                    if profile is not None:
+                        profile.step(task, code, pos)
+                    instructions += 1
+                    if code in CALL_CODES:
+                        calls += 1
+                    if len(task.branchStack) > returnHigh:
+                        returnHigh = len(task.branchStack)
+                    if len(task.dataStack) > dataHigh:
+                        dataHigh = len(task.dataStack)
+                if task is state and not task.paused:
+                    break
+                task = task.scheduler.switch(task)
+        finally:
+            metrics.instructions += instructions
+            metrics.calls += calls
+            metrics.dataStackHighWater, metrics.returnStackHighWater = dataHigh, returnHigh
+
+    def interpretProfiled(self, state: InterpretState, codes, var_count, start):
+        # Same loop as interpret, reporting each instruction to the memory profile.
+        self.resume(state, codes, var_count, start)
+        profile = self.memoryProfile
+
+        task = state
+        while True:
+            while not task.end:
+                pos = task.pos
+                code = task.codes[pos]
+                Primitives[code]['execute'](task)
+                profile.step(task, code, pos)
+            if task is state and not task.paused:
+                break
+            task = task.scheduler.switch(task)
+
+    def memoryReport(self, file=None):
+        """Prints where memory went, by Forth word, interpreter structure and Python line. Requires memoryProfile=True."""
+        self.memoryProfile.report(self.interpretState, file)
+
+    async def interpretAsync(self, state: InterpretState, codes, var_count, start, sliceSize, fuel, timeout):
+        import asyncio
+        self.resume(state, codes, var_count, start)
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        executed = 0
+        metrics = self.metrics
+        if metrics is not None:
+            from metrics import CALL_CODES
+
+        task = state
+        while True:
+            budget = sliceSize if fuel is None else min(sliceSize, fuel - executed)
+            count = 0
+            try:
+                if metrics is None:
+                    for count in range(budget):
+                        code = task.codes[task.pos]
+                        Primitives[code]['execute'](task)
+                        if task.end:
+                            break
+                    else:
+                        count = budget
+                else:
+                    # Same slice with the counters interpretCounted keeps.
+                    for count in range(budget):
+                        code = task.codes[task.pos]
+                        Primitives[code]['execute'](task)
+                        if code in CALL_CODES:
+                            metrics.calls += 1
+                        if len(task.branchStack) > metrics.returnStackHighWater:
+                            metrics.returnStackHighWater = len(task.branchStack)
+                        if len(task.dataStack) > metrics.dataStackHighWater:
+                            metrics.dataStackHighWater = len(task.dataStack)
+                        if task.end:
+                            break
+                    else:
+                        count = budget
+            except InputPending:
+                await task.input.fill()
+            executed += count
+            if metrics is not None:
+                metrics.instructions += count
+            if task.end:
+                if task is state and not task.paused:
+                    break
+                task = task.scheduler.switch(task)
+            if fuel is not None and executed >= fuel:
+                self.abort(state)
+                raise FuelExhausted(f'exceeded {fuel} instructions')
+            if deadline is not None and loop.time() >= deadline:
+                self.abort(state)
+                raise DeadlineExceeded(f'exceeded {timeout} seconds')
+            if hasattr(state.output, 'drain'):
+                await state.output.drain()
+            await asyncio.sleep(0)
+        if hasattr(state.output, 'drain'):
+            await state.output.drain()
+
+    def abort(self, state: InterpretState):
+        # Park on the final END so the next run starts from fresh code, dropping any tasks.
+        state.pos = len(state.codes) - 1
+        state.branchStack.clear()
+        state.scheduler = None
+        state.end = True
+        state.paused = False
\ No newline at end of file
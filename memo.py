@@ -0,0 +1,118 @@
+from collections import OrderedDict
+from state import InterpretState, CompileState
+from primitives import primitive, compileTime, Operands, runWord
+
+MEMO_CACHE_SIZE : int = 1024 # Results kept per memoized word before the least recently used is evicted.
+
+# Codes that only read and write the data and return stacks. Anything else makes a word impure.
+PURE_CODES = frozenset(('+', '-', '*', '/', 'MOD', '/MOD', '<', '>', '=', 'AND', 'OR', 'INVERT',
+                        'SWAP', 'DUP', 'DROP', 'OVER', 'ROT', '2SWAP', '2OVER', '2DROP',
+                        'PUSH', 'CALL', 'MEMOCALL', 'IF', 'ELSE', 'DO', 'LOOP', 'I', ';',
+                        'BLOCK', 'LIFTED CODE'))
+
+class MemoCache:
+    """Bounded LRU cache of a word's results, keyed on its input stack values."""
+    def __init__(self, name:str, address:int, inputs:int, outputs:int, size:int=MEMO_CACHE_SIZE):
+        self.name = name
+        self.address = address
+        self.inputs = inputs
+        self.outputs = outputs
+        self.size = size
+        self.results : OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, key:tuple):
+        try:
+            results = self.results[key]
+            self.results.move_to_end(key)
+        except KeyError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return results
+
+    def store(self, key:tuple, results:tuple) -> None:
+        self.results[key] = results
+        if len(self.results) > self.size:
+            self.results.popitem(last=False)
+
+def findImpureCode(codes:list, address:int, operands:dict, memos:list, slots:list, bindings:dict):
+    """
+    Returns the first code reachable from the word at address that is not pure, or None.
+    Words it calls are checked too, late-bound ones through their current slot target.
+    """
+    lateSlots = set(bindings.values())
+    pending, seen = [address], set()
+    while pending:
+        pos = pending.pop()
+        if pos in seen:
+            continue
+        seen.add(pos)
+        while codes[pos] != ';':
+            code = codes[pos]
+            if code not in PURE_CODES and not (code == 'DEFERCALL' and codes[pos+1] in lateSlots):
+                return code
+            if code == 'CALL':
+                pending.append(codes[pos+1])
+            elif code == 'MEMOCALL':
+                pending.append(memos[codes[pos+1]].address)
+            elif code == 'DEFERCALL' and codes[pos+1] in lateSlots:
+                pending.append(slots[codes[pos+1]])
+            pos += 1 + operands.get(code, 0)
+    return None
+
+@primitive("MEMOCALL")
+def memoCall(state:InterpretState) -> None:
+    memo = state.memos[state.codes[state.pos+1]]
+    key = tuple(state.dataStack[len(state.dataStack)-memo.inputs:])
+    results = memo.lookup(key)
+    if results is None:
+        runWord(state, memo.address)
+        memo.store(key, tuple(state.dataStack[len(state.dataStack)-memo.outputs:]))
+    else:
+        del state.dataStack[len(state.dataStack)-memo.inputs:]
+        state.dataStack.extend(results)
+    state.pos += 2
+
+@compileTime("MEMOCALL")
+def memoCall(state:CompileState) -> None:
+    """Has no compile-time behavior."""
+    return None
+
+@compileTime("MEMO")
+def memo(state:CompileState) -> None:
+    """
+    Follows the ; of a pure word and declares its stack effect, e.g. ; MEMO ( n -- n )
+    Calls to the word then look their inputs up in an LRU cache before running it.
+    """
+    word, address = state.latest, state.words[state.latest]
+    if state.tokens[state.pos+1:state.pos+2] != ['('] or ')' not in state.tokens[state.pos:]:
+        print('MEMO needs a stack effect:', word, file=state.output)
+        return
+    close = state.tokens.index(')', state.pos)
+    effect = state.tokens[state.pos+2:close]
+    state.pos = close
+    if '--' not in effect:
+        print('MEMO needs a stack effect:', word, file=state.output)
+        return
+    impure = findImpureCode(state.codes, address, Operands, state.memos, state.slots, state.bindings)
+    if impure is not None:
+        print('Cannot memoize', word, 'because it uses', impure, file=state.output)
+        return
+    index = len(state.memos)
+    inputs = effect.index('--')
+    state.memos.append(MemoCache(word, address, inputs, len(effect) - inputs - 1))
+    if word in state.bindings:
+        # Late-bound callers keep going through the slot, which now leads to a memoized stub.
+        state.slots[state.bindings[word]] = len(state.codes)
+        state.codes.extend(('MEMOCALL', index, ';'))
+        state.last_return = len(state.codes)
+        return
+    state.memoized[word] = index
+    pos = address
+    while pos < len(state.codes):
+        if state.codes[pos] == 'CALL' and state.codes[pos+1] == address:
+            state.codes[pos] = 'MEMOCALL'
+            state.codes[pos+1] = index
+        pos += 1 + Operands.get(state.codes[pos], 0)
\ No newline at end of file
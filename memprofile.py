@@ -0,0 +1,96 @@
+import sys, tracemalloc
+from state import InterpretState, CompileState
+from primitives import primitive
+
+TOP_WORDS : int = 20 # Words listed in the report.
+TOP_SITES : int = 10 # Python allocation sites listed in the report.
+TOP_LEVEL : str = '(top level)'
+ENTERING = frozenset(('CALL', 'DEFERCALL', 'EXECUTE')) # Codes that continue in another word's body.
+
+def deepSize(container) -> int:
+    """Size of a container plus the objects directly in it. Shared strings such as lexemes are counted each time."""
+    return sys.getsizeof(container) + sum(sys.getsizeof(item) for item in container)
+
+def structureSizes(interpretState:InterpretState, compileState:CompileState = None) -> dict:
+    """Bytes held by each interpreter structure. The compile state's are included when given."""
+    sizes = {
+        'dataStack': deepSize(interpretState.dataStack),
+        'branchStack': deepSize(interpretState.branchStack),
+        'floatStack': sys.getsizeof(interpretState.floatStack),
+        'codes': deepSize(interpretState.codes),
+        'variables': deepSize(interpretState.variables),
+        'dataSpace': sys.getsizeof(interpretState.dataSpace),
+        'memos': sum(deepSize(memo.results) + sum(deepSize(key) for key in memo.results) for memo in interpretState.memos),
+    }
+    if compileState is not None:
+        sizes['tokens'] = deepSize(compileState.tokens)
+        sizes['dictionary'] = sum(deepSize(getattr(compileState, name)) for name in ('words', 'variables', 'strings'))
+    return sizes
+
+class MemoryProfile:
+    """
+    Charges the growth of traced memory during each instruction to the Forth word executing it.
+    Words are tracked on a call stack per task: entered when a CALL, DEFERCALL or EXECUTE lands
+    in their body and left when their return address is popped.
+    """
+    def __init__(self, compileState:CompileState):
+        self.compileState = compileState
+        self.allocated : dict = {} # Word to bytes of net growth while it was running.
+        self.peaks : dict = {} # Word to the highest traced memory seen while it was running.
+        self.calls : dict = {} # Task to its stack of (word, return stack depth).
+        self.names : dict = {}
+        self.dictVersion = -1
+        tracemalloc.start()
+        self.last = tracemalloc.get_traced_memory()[0]
+
+    def nameOf(self, address:int) -> str:
+        if self.dictVersion != self.compileState.dictVersion:
+            self.names = {address: name for name, address in self.compileState.words.items()}
+            self.dictVersion = self.compileState.dictVersion
+        return self.names.get(address, f'(code {address})')
+
+    def step(self, task:InterpretState, code:str, pos:int) -> None:
+        """Called after every instruction, with the code and position it was at."""
+        calls = self.calls.setdefault(id(task), [])
+        while calls and len(task.branchStack) < calls[-1][1]:
+            calls.pop()
+        if code == 'MEMOCALL':
+            word = task.memos[task.codes[pos+1]].name
+        else:
+            word = calls[-1][0] if calls else TOP_LEVEL
+        current, _ = tracemalloc.get_traced_memory()
+        if current > self.last:
+            self.allocated[word] = self.allocated.get(word, 0) + current - self.last
+        if current > self.peaks.get(word, 0):
+            self.peaks[word] = current
+        self.last = current
+        if code in ENTERING:
+            calls.append((self.nameOf(task.pos), len(task.branchStack)))
+
+    def report(self, interpretState:InterpretState, file=None) -> None:
+        current, peak = tracemalloc.get_traced_memory()
+        print(f'Traced memory: {current / 1024:.1f} KiB now, {peak / 1024:.1f} KiB peak', file=file)
+        print('Allocated while running, by word:', file=file)
+        for word, size in sorted(self.allocated.items(), key=lambda item: -item[1])[:TOP_WORDS]:
+            print(f'  {word:<24} {size / 1024:10.1f} KiB  (peak {self.peaks[word] / 1024:.1f} KiB)', file=file)
+        print('Interpreter structures:', file=file)
+        for name, size in structureSizes(interpretState, self.compileState).items():
+            print(f'  {name:<24} {size / 1024:10.1f} KiB', file=file)
+        print('Python allocation sites:', file=file)
+        snapshot = tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, __file__),))
+        for stat in snapshot.statistics('lineno')[:TOP_SITES]:
+            print(f'  {stat}', file=file)
+
+@primitive("MEM.")
+def memDot(state:InterpretState) -> None:
+    """
+    ( -- )
+    Prints the memory held by the stacks, code, variables, data space and memo caches,
+    and the traced memory when profiling.
+    """
+    for name, size in structureSizes(state).items():
+        print(f'{name}: {size} bytes', file=state.output)
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        print(f'traced: {current} bytes, peak {peak} bytes', file=state.output)
+    state.pos += 1
@@ -0,0 +1,78 @@
+import json, sys
+from dataclasses import dataclass, asdict
+
+CALL_CODES = frozenset(('CALL', 'MEMOCALL', 'DEFERCALL', 'EXECUTE')) # Codes counted as calls.
+
+@dataclass
+class Metrics:
+    """Runtime counters kept by an Interpreter created with metrics=True."""
+    instructions: int       = 0
+    calls: int              = 0
+    runs: int               = 0
+    compileSeconds: float   = 0.0
+    runSeconds: float       = 0.0
+    dataStackHighWater: int = 0
+    returnStackHighWater: int = 0
+    outputBytes: int        = 0
+
+# Name, type and help text of every exported metric, in export order.
+DESCRIPTIONS = (
+    ('instructions', 'counter', 'Instructions executed.'),
+    ('calls', 'counter', 'Calls to colon definitions, including deferred, memoized and EXECUTE calls.'),
+    ('runs', 'counter', 'Inputs compiled and run.'),
+    ('compileSeconds', 'counter', 'Time spent compiling.'),
+    ('runSeconds', 'counter', 'Time spent executing.'),
+    ('dataStackHighWater', 'gauge', 'Deepest data stack seen.'),
+    ('returnStackHighWater', 'gauge', 'Deepest return stack seen.'),
+    ('outputBytes', 'counter', 'Bytes printed by the program.'),
+    ('codeSize', 'gauge', 'Cells of compiled code.'),
+    ('wordsDefined', 'gauge', 'Colon definitions in the dictionary.'),
+    ('variables', 'gauge', 'Variables in the dictionary.'),
+    ('dataSpaceBytes', 'gauge', 'Bytes allotted in data space.'),
+)
+
+class CountingOutput:
+    """Output stream wrapper that counts the bytes written through it."""
+    def __init__(self, metrics:Metrics, stream):
+        self.metrics = metrics
+        self.stream = stream
+
+    def write(self, text):
+        self.metrics.outputBytes += len(text.encode())
+        return (self.stream or sys.stdout).write(text)
+
+    def __getattr__(self, name):
+        # Everything else (flush, drain, key...) goes to the wrapped stream.
+        return getattr(self.stream or sys.stdout, name)
+
+def snakeCase(name:str) -> str:
+    return ''.join('_' + c.lower() if c.isupper() else c for c in name)
+
+def prometheus(values:dict, prefix:str = 'pyforth') -> str:
+    """Formats metric values in the Prometheus text exposition format."""
+    lines = []
+    for name, kind, text in DESCRIPTIONS:
+        metric = f'{prefix}_{snakeCase(name)}'
+        if kind == 'counter':
+            metric += '_total'
+        lines.append(f'# HELP {metric} {text}')
+        lines.append(f'# TYPE {metric} {kind}')
+        lines.append(f'{metric} {values[name]}')
+    return '\n'.join(lines) + '\n'
+
+def dump(values:dict, path:str, format:str = None) -> None:
+    """Writes metrics to path as JSON if format is 'json' or the path ends in .json, otherwise as Prometheus text."""
+    if format is None:
+        format = 'json' if path.endswith('.json') else 'prometheus'
+    text = json.dumps(values, indent=2) + '\n' if format == 'json' else prometheus(values)
+    with open(path, 'w') as file:
+        file.write(text)
+
+def collect(metrics:Metrics, compileState, interpretState) -> dict:
+    """Counters plus gauges read from the current dictionary."""
+    values = asdict(metrics)
+    values['codeSize'] = len(compileState.codes)
+    values['wordsDefined'] = len(compileState.words)
+    values['variables'] = len(compileState.variables)
+    values['dataSpaceBytes'] = len(interpretState.dataSpace)
+    return values
@@ -0,0 +1,295 @@
+from __future__ import annotations
+from typing import Dict, List, Tuple
+from state import InterpretState, CompileState
+from primitives import Primitives, primitive, compileTime, Operands
+
+MIN_BLOCK_LENGTH : int = 2 # Shortest run of codes worth replacing. One code is already a single dispatch.
+LIFTED : str = 'LIFTED CODE' # Fills the rest of a replaced run, so code can still be walked cell by cell. It can't be typed.
+
+# Python expressions for the operators that can be lifted, in terms of the top of stack a and the cell under it b.
+EXPRESSIONS : Dict[str, str] = {
+    '+': '{b} + {a}', '-': '{b} - {a}', '*': '{b} * {a}', '/': '{b} // {a}', 'MOD': '{b} % {a}',
+    '<': '(-1 if {a} < {b} else 0)', '>': '(-1 if {a} > {b} else 0)', '=': '(-1 if {a} == {b} else 0)',
+    'AND': '{b} & {a}', 'OR': '{b} | {a}', 'INVERT': '~{a}',
+}
+COMMUTATIVE = frozenset(('+', '*', '=', 'AND', 'OR'))
+TRAPPING = frozenset(('/', 'MOD')) # Can raise, so they are computed even when their result is unused.
+SHUFFLES = frozenset(('DUP', 'DROP', 'SWAP', 'OVER', 'ROT', '2SWAP', '2OVER', '2DROP'))
+LIFTABLE = frozenset(EXPRESSIONS) | SHUFFLES | {'PUSH', 'I', '/MOD'}
+BRANCHES = ('IF', 'ELSE', 'LOOP') # Codes whose operand is a code address inside the same word.
+MAX_UNROLLED_CELLS : int = 256 # Most cells one counted loop may grow to when it is unrolled.
+
+class Block:
+    """A straight-line run of stack code compiled to one Python function that covers length cells."""
+    def __init__(self, source:str, length:int):
+        self.source = source
+        self.length = length
+        namespace = {}
+        exec(source, namespace)
+        self.run = namespace['block']
+
+    def __reduce__(self):
+        # Generated functions can't be pickled, so compiled include caches store the source instead.
+        return (Block, (self.source, self.length))
+
+class Lifter:
+    """
+    Symbolically executes a run of stack code. Stack cells become SSA values: the block's inputs,
+    constants, or operations on other values. Identical operations are numbered once (CSE).
+    """
+    def __init__(self):
+        self.values : List[tuple] = []
+        self.numbers : Dict[tuple, int] = {}
+        self.stack : List[int] = []
+        self.inputs = 0 # Cells read from below the block's own stack.
+        self.trapping : List[int] = []
+
+    def value(self, key:tuple) -> int:
+        if key not in self.numbers:
+            self.numbers[key] = len(self.values)
+            self.values.append(key)
+        return self.numbers[key]
+
+    def pop(self) -> int:
+        if self.stack:
+            return self.stack.pop()
+        self.inputs += 1
+        return self.value(('in', self.inputs - 1))
+
+    def take(self, n:int) -> List[int]:
+        """Pops n values, returned deepest first."""
+        return [self.pop() for _ in range(n)][::-1]
+
+    def operate(self, op:str, *args:int) -> int:
+        if op in COMMUTATIVE:
+            args = tuple(sorted(args))
+        kinds = [self.values[arg] for arg in args]
+        if all(kind[0] == 'const' for kind in kinds) and not (op in TRAPPING and kinds[-1][1] == 0):
+            # Constant folding, with the same expression the block would evaluate.
+            operands = dict(zip('ba'[-len(args):], (repr(kind[1]) for kind in kinds)))
+            return self.value(('const', eval(EXPRESSIONS[op].format(**operands))))
+        number = self.value((op, *args))
+        if op in TRAPPING and number not in self.trapping:
+            self.trapping.append(number)
+        return number
+
+    def step(self, code:str, operand=None) -> None:
+        push = self.stack.extend
+        if code == 'PUSH':
+            push((self.value(('const', operand)),))
+        elif code == 'I':
+            push((self.value(('I',)),))
+        elif code == '/MOD':
+            b, a = self.take(2)
+            push((self.operate('MOD', b, a), self.operate('/', b, a)))
+        elif code in EXPRESSIONS:
+            push((self.operate(code, *self.take(1 if code == 'INVERT' else 2)),))
+        elif code == 'DUP':
+            a, = self.take(1)
+            push((a, a))
+        elif code == 'DROP':
+            self.take(1)
+        elif code == 'SWAP':
+            b, a = self.take(2)
+            push((a, b))
+        elif code == 'OVER':
+            b, a = self.take(2)
+            push((b, a, b))
+        elif code == 'ROT':
+            c, b, a = self.take(3)
+            push((b, a, c))
+        elif code == '2SWAP':
+            d, c, b, a = self.take(4)
+            push((b, a, d, c))
+        elif code == '2OVER':
+            d, c, b, a = self.take(4)
+            push((d, c, b, a, d, c))
+        elif code == '2DROP':
+            self.take(2)
+
+    def live(self) -> List[int]:
+        """Values that are on the final stack or may raise, plus everything they use (dead-code elimination)."""
+        pending, seen = list(self.stack) + self.trapping, set()
+        while pending:
+            number = pending.pop()
+            if number not in seen:
+                seen.add(number)
+                key = self.values[number]
+                if key[0] in EXPRESSIONS:
+                    pending.extend(key[1:])
+        return sorted(seen)
+
+    def unchanged(self) -> int:
+        """How many of the deepest input cells end up back where they were (stack-shuffle removal)."""
+        kept = 0
+        while (kept < min(self.inputs, len(self.stack))
+               and self.values[self.stack[kept]] == ('in', self.inputs - 1 - kept)):
+            kept += 1
+        return kept
+
+    def lower(self) -> str:
+        """Generates the Python source of a function block(stack, rstack) with the run's effect."""
+        names = {}
+        lines = []
+        if self.inputs:
+            lines.append(f'    if len(stack) < {self.inputs}: raise IndexError("stack underflow")')
+        for number in self.live():
+            key = self.values[number]
+            if key[0] == 'const':
+                names[number] = repr(key[1])
+            elif key[0] == 'in':
+                names[number] = f'a{key[1]}'
+                lines.append(f'    a{key[1]} = stack[-{key[1] + 1}]')
+            elif key[0] == 'I':
+                names[number] = 'i'
+                lines.append('    i = rstack[-1]')
+            else:
+                operands = dict(zip('ba'[-len(key) + 1:], (names[arg] for arg in key[1:])))
+                names[number] = f't{number}'
+                lines.append(f'    t{number} = {EXPRESSIONS[key[0]].format(**operands)}')
+        kept = self.unchanged()
+        written = self.inputs - kept
+        results = ', '.join(names[number] for number in self.stack[kept:])
+        if written and results:
+            lines.append(f'    stack[len(stack)-{written}:] = ({results},)')
+        elif written:
+            lines.append(f'    del stack[len(stack)-{written}:]')
+        elif results:
+            lines.append(f'    stack.extend(({results},))')
+        return 'def block(stack, rstack):\n' + '\n'.join(lines or ['    pass']) + '\n'
+
+    def isIdentity(self) -> bool:
+        return not self.trapping and self.unchanged() == self.inputs == len(self.stack)
+
+def branchTargets(codes:list, start:int, end:int) -> set:
+    targets = set()
+    pos = start
+    while pos < end:
+        if codes[pos] in BRANCHES and codes[pos+1] is not None:
+            targets.add(codes[pos+1])
+        pos += 1 + Operands.get(codes[pos], 0)
+    return targets
+
+def runs(codes:list, start:int, end:int) -> List[Tuple[int, int]]:
+    """Maximal runs of liftable codes in [start, end) that no branch jumps into."""
+    targets = branchTargets(codes, start, end)
+    found, runStart, pos = [], None, start
+    while pos < end:
+        code = codes[pos]
+        if runStart is not None and (code not in LIFTABLE or pos in targets):
+            found.append((runStart, pos))
+            runStart = None
+        if runStart is None and code in LIFTABLE:
+            runStart = pos
+        pos += 1 + Operands.get(code, 0)
+    if runStart is not None:
+        found.append((runStart, end))
+    return found
+
+def optimize(state:CompileState, start:int, end:int) -> None:
+    """
+    Replaces each run of pure stack code in [start, end) with one BLOCK code and the index of its
+    generated function, or with an ELSE jump past it when the run leaves the stack as it was.
+    The rest of the run is filled with LIFTED cells, so no other code moves.
+    """
+    for runStart, runEnd in runs(state.codes, start, end):
+        lifter, pos, count = Lifter(), runStart, 0
+        while pos < runEnd:
+            code = state.codes[pos]
+            lifter.step(code, state.codes[pos+1] if code == 'PUSH' else None)
+            pos += 1 + Operands.get(code, 0)
+            count += 1
+        if count < MIN_BLOCK_LENGTH:
+            continue
+        if lifter.isIdentity():
+            replacement = ('ELSE', runEnd)
+        else:
+            replacement = ('BLOCK', len(state.blocks))
+            state.blocks.append(Block(lifter.lower(), runEnd - runStart))
+        state.codes[runStart:runEnd] = replacement + (LIFTED,) * (runEnd - runStart - 2)
+
+def copyBody(codes:list, body:int, end:int, at:int, index=None) -> list:
+    """
+    A copy of the loop body codes[body:end] to be placed at address at, with the branches inside it
+    relocated. Unless index is None, I at the loop's own level becomes a literal index.
+    """
+    moved, copied, pos, depth = {}, [], body, 0
+    while pos < end:
+        code = codes[pos]
+        size = 1 + Operands.get(code, 0)
+        moved[pos] = at + len(copied)
+        if code == 'I' and depth == 0 and index is not None:
+            copied.extend(('PUSH', index))
+        else:
+            copied.extend(codes[pos:pos + size])
+        depth += (code == 'DO') - (code == 'LOOP')
+        pos += size
+    moved[end] = at + len(copied) # Branches to the LOOP go on to the next copy.
+    pos = 0
+    while pos < len(copied):
+        if copied[pos] in BRANCHES:
+            copied[pos+1] = moved[copied[pos+1]]
+        pos += 1 + Operands.get(copied[pos], 0)
+    return copied
+
+def unroll(state:CompileState, doPos:int) -> None:
+    """
+    Unrolls the DO ... LOOP just compiled at the end of the code when both of its bounds are literals.
+    When every iteration fits in MAX_UNROLLED_CELLS the loop is replaced by one copy of its body per
+    index, with I as a literal. Otherwise a body that doesn't use I is repeated by the largest factor
+    that divides the trip count and fits, and the loop runs that many times fewer.
+    Nothing outside the loop moves, since it is still the last code compiled, and loops whose bounds
+    were compiled by an earlier Interpreter.compile are left alone, since that code may have run.
+    """
+    codes = state.codes
+    header, loopPos = doPos - 5, len(codes) - 2
+    start = min(state.last_return, state.words.get(state.latest, state.last_return))
+    if header < max(start, state.compileStart) or any(type(pos) is int and header < pos < len(codes) for pos in state.branchStack):
+        return
+    starts, pos = set(), start
+    while pos < len(codes):
+        starts.add(pos)
+        code = codes[pos]
+        if code in BRANCHES and pos < header and header < (codes[pos+1] or -1) < len(codes):
+            return # Something else jumps into the loop.
+        if doPos <= pos < loopPos and (code == ';' or code in BRANCHES and not doPos <= (codes[pos+1] or -1) <= loopPos):
+            return # The body leaves the loop.
+        pos += 1 + Operands.get(code, 0)
+    if not ({header, header + 2, doPos - 1} <= starts and codes[header] == codes[header+2] == 'PUSH'
+            and codes[doPos-1] == 'DO' and type(codes[header+1]) is int and type(codes[header+3]) is int):
+        return
+    limit, first = codes[header+1], codes[header+3]
+    trips = max(1, limit - first) # LOOP tests after the body, so it always runs once.
+    usesIndex, pos, depth = 0, doPos, 0
+    while pos < loopPos:
+        code = codes[pos]
+        usesIndex += code == 'I' and depth == 0
+        depth += (code == 'DO') - (code == 'LOOP')
+        pos += 1 + Operands.get(code, 0)
+    bodyCells = loopPos - doPos
+    if trips * (bodyCells + usesIndex) <= MAX_UNROLLED_CELLS:
+        unrolled = []
+        for index in range(first, first + trips):
+            unrolled += copyBody(codes, doPos, loopPos, header + len(unrolled), index)
+        codes[header:] = unrolled
+        return
+    factors = [factor for factor in range(2, MAX_UNROLLED_CELLS // max(bodyCells, 1) + 1) if trips % factor == 0]
+    if usesIndex or not factors:
+        return
+    unrolled = ['PUSH', trips // factors[-1], 'PUSH', 0, 'DO']
+    for _ in range(factors[-1]):
+        unrolled += copyBody(codes, doPos, loopPos, header + len(unrolled))
+    codes[header:] = unrolled + ['LOOP', doPos]
+
+@primitive("BLOCK")
+def block(state:InterpretState) -> None:
+    block = state.blocks[state.codes[state.pos+1]]
+    block.run(state.dataStack, state.branchStack)
+    state.pos += block.length
+
+@compileTime("BLOCK")
+def block(state:CompileState) -> None:
+    """Has no compile-time behavior."""
+    return None
+
+Primitives[LIFTED] = {"compile": None, "execute": None}
@@ -0,0 +1,108 @@
+import atexit, itertools, multiprocessing
+from state import InterpretState, CompileState, SHARED_FIELDS
+from primitives import primitive, compileTime
+from tasks import TASK_EXIT
+
+# One fork pool per process. Workers inherit the code, variables and data space
+# as they were when the pool was forked, so nothing is pickled except arguments and results.
+pool = None
+image : tuple = None # (state, codes, code size) captured at fork time.
+jobs : dict = {}
+jobIds = itertools.count()
+
+class Finished:
+    """Stands in for the AsyncResult of a job that was run in this process."""
+    def __init__(self, value:list):
+        self.value = value
+
+    def get(self) -> list:
+        return self.value
+
+    def wait(self) -> None:
+        pass
+
+def runWord(state:InterpretState, address:int, args:list, variables:list, dataSpace:bytearray) -> list:
+    import interpreter
+    shared = {name: getattr(state, name) for name in SHARED_FIELDS}
+    shared['dataSpace'] = dataSpace
+    task = InterpretState(**shared, variables=variables, dataStack=args, branchStack=[TASK_EXIT])
+    interpreter.Interpreter().interpret(task, state.codes, len(state.variables), address)
+    return task.dataStack
+
+def work(address:int, args:list) -> list:
+    """Runs one word in a worker process and returns the stack it leaves."""
+    state, _, _ = image
+    return runWord(state, address, args, state.variables, state.dataSpace)
+
+def fork(state:InterpretState) -> None:
+    """(Re)creates the pool so the workers see the current code, variables and data space."""
+    global pool, image
+    # Jobs still running in the old pool are finished first, so COLLECT can still get their results.
+    for result in jobs.values():
+        result.wait()
+    shutdown()
+    image = (state, state.codes, len(state.codes))
+    pool = multiprocessing.get_context('fork').Pool()
+
+def submit(state:InterpretState, address:int, args:list) -> int:
+    jobId = next(jobIds)
+    if multiprocessing.current_process().daemon:
+        # Daemonic processes, such as --batch workers, can't have children: run the word here,
+        # on copies of the variables and data space as a worker would see them.
+        jobs[jobId] = Finished(runWord(state, address, args, list(state.variables), bytearray(state.dataSpace)))
+        return jobId
+    if pool is None or image[1] is not state.codes or image[2] != len(state.codes):
+        fork(state)
+    jobs[jobId] = pool.apply_async(work, (address, args))
+    return jobId
+
+def collect(jobId:int) -> list:
+    return jobs.pop(jobId).get()
+
+@atexit.register
+def shutdown() -> None:
+    global pool
+    if pool is not None:
+        pool.terminate()
+        pool = None
+
+@primitive("SUBMIT")
+def submitWord(state:InterpretState) -> None:
+    """
+    ( x1 .. xn n -- job )
+    Runs the word named after SUBMIT on the n arguments in a worker process.
+    """
+    n = state.dataStack.pop()
+    if n > len(state.dataStack):
+        raise IndexError('stack underflow')
+    args = state.dataStack[len(state.dataStack)-n:]
+    del state.dataStack[len(state.dataStack)-n:]
+    state.dataStack.append(submit(state, state.codes[state.pos+1], args))
+    state.pos += 2
+
+@compileTime("SUBMIT")
+def submitWord(state:CompileState) -> None:
+    word = state.tokens[state.pos+1]
+    if word in state.words:
+        state.codes.extend(('SUBMIT', state.words[word]))
+    else:
+        print('SUBMIT needs a colon definition:', word, file=state.output)
+    state.pos += 1
+
+@primitive("COLLECT")
+def collectWord(state:InterpretState) -> None:
+    """
+    ( job -- y1 .. ym )
+    Waits for a submitted job and pushes the stack its word left.
+    """
+    state.dataStack.extend(collect(state.dataStack.pop()))
+    state.pos += 1
+
+@primitive("PARALLEL-SYNC")
+def parallelSync(state:InterpretState) -> None:
+    """
+    ( -- )
+    Re-forks the workers so they see the current variables and data space.
+    """
+    fork(state)
+    state.pos += 1
\ No newline at end of file
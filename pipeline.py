@@ -0,0 +1,71 @@
+import queue, threading
+from helpers import tokenize, STRING_WORDS
+
+PIPELINE_DEPTH : int = 64 # Segments the producer may get ahead of execution.
+MAX_SEGMENT_TOKENS : int = 4096 # Long stretches of top-level code are split into segments of about this size.
+OPENERS = frozenset(('IF', 'DO', 'BEGIN'))
+CLOSERS = frozenset(('THEN', 'LOOP', 'UNTIL', 'REPEAT', 'AGAIN'))
+PARSING_WORDS = frozenset(('VARIABLE', 'DEFER', "'", "[']", 'IS', 'SPAWN', 'SUBMIT', 'INCLUDE', 'REQUIRE')) # Read the next token as a name.
+
+def segments(lines):
+    """
+    Tokenizes source lines and yields them in segments that can be compiled and run on their own:
+    each colon definition, and the top-level code between definitions. Segments never end inside
+    a control structure, a comment or a string literal, nor separate a parsing word such as
+    VARIABLE from its name or MEMO from its stack effect.
+    """
+    current, inDefinition, nesting, inComment, literalNext = [], False, 0, False, False
+    for line in lines:
+        for token in tokenize(line):
+            if literalNext:
+                current.append(token)
+                literalNext = False
+                continue
+            if inComment:
+                current.append(token)
+                inComment = token != ')'
+                continue
+            if token == ':' and not inDefinition and nesting == 0 and current:
+                yield current
+                current = []
+            current.append(token)
+            if token == '(':
+                inComment = True
+            elif token in STRING_WORDS or token in PARSING_WORDS:
+                literalNext = True
+            elif token == ':':
+                inDefinition = literalNext = True
+            elif token in OPENERS:
+                nesting += 1
+            elif token in CLOSERS:
+                nesting -= 1
+            elif token == ';' and inDefinition and nesting == 0:
+                inDefinition = False
+                yield current
+                current = []
+            elif not inDefinition and nesting == 0 and len(current) >= MAX_SEGMENT_TOKENS and token != 'MEMO':
+                yield current
+                current = []
+    if current:
+        yield current
+
+def produce(lines, segmentQueue:queue.Queue) -> None:
+    """Producer thread: reads, tokenizes and segments the source. Ends with None, or the exception it hit."""
+    try:
+        for segment in segments(lines):
+            segmentQueue.put(segment)
+        segmentQueue.put(None)
+    except BaseException as e:
+        segmentQueue.put(e)
+
+def runPipelined(forth, lines) -> None:
+    """Runs each segment as soon as it is ready while a producer thread prepares the ones after it."""
+    segmentQueue = queue.Queue(PIPELINE_DEPTH)
+    threading.Thread(target=produce, args=(lines, segmentQueue), daemon=True).start()
+    while True:
+        segment = segmentQueue.get()
+        if segment is None:
+            break
+        if isinstance(segment, BaseException):
+            raise segment
+        forth.run(segment)
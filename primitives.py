@@ -1,81 +1,107 @@
 from __future__ import annotations
+import importlib
 from typing import Dict, Callable
 from state import InterpretState, CompileState
-from getch import getch
 
 Primitives : Dict[str, Dict[str,function]] = {} #The main export of this file.
-
-def primitive(func) -> None:
+Operands : Dict[str, int] = {'PUSH': 1, 'FPUSH': 1, 'CALL': 1, 'MEMOCALL': 1, 'IF': 1, 'ELSE': 1, 'LOOP': 1,
+                             'SPAWN': 1, 'SUBMIT': 1,
+                             'XT': 1, 'DEFERCALL': 1, 'IS': 1, 'PYCALL': 1, 'BLOCK': 1} # Cells of inline data following each code.
+WordSets : Dict[str, str] = {lexeme: module for module, lexemes in {
+    'filewords': ('R/O', 'W/O', 'R/W', 'BIN', 'OPEN-FILE', 'CREATE-FILE', 'CLOSE-FILE', 'READ-FILE', 'READ-LINE',
+                  'WRITE-FILE', 'WRITE-LINE', 'FLUSH-FILE'),
+    'floatwords': ('FPUSH', 'F+', 'F-', 'F*', 'F/', 'FSQRT', 'F@', 'F!', 'FLOATS', 'F.', 'S>F', 'F>S'),
+    'tasks': ('SPAWN', 'PAUSE', 'JOIN'),
+    'parallel': ('SUBMIT', 'COLLECT', 'PARALLEL-SYNC'),
+    'memo': ('MEMO', 'MEMOCALL'),
+    'includes': ('INCLUDE', 'REQUIRE'),
+    'debugwords': ('DEBUG', '.MEMO'),
+    'memprofile': ('MEM.',),
+    'inputwords': ('KEY?', 'ACCEPT', 'REFILL', 'SOURCE'),
+    'ffi': ('PYCALL',),
+    'optimizer': ('BLOCK',),
+}.items() for lexeme in lexemes} # Words of the optional word sets, mapped to the module defining them.
+
+def primitive(lexeme:str) -> Callable:
     """
-    Decorator which automatically adds a primitve word to the Primitives dictionary.
-    It creates a default compile-time behavior for the primitive if none is provided.
-    Lexemes for the primitives must be provided in the docstring of the function.
+    Decorator which adds the run-time behavior of a primitive word to the Primitives dictionary.
+    Unless the word also has a compileTime function, compiling it just appends the lexeme.
     """
-    docstring = func.__doc__
-    specialCompile : bool = docstring.find(" | (Function Implements Special Compile-Time Behavior)") != -1
-    lexeme = docstring[docstring.find("Lexeme: ") + 8:].split()[0].strip()
-    funcs = Primitives.get(lexeme, {"compile": None, "execute": None})
-    if specialCompile:
-        funcs["compile"] = func
-    else:
-        defaultCompile : Callable[[CompileState], None] = lambda state: state.codes.append(lexeme)
-        funcs["compile"] = defaultCompile
+    def register(func):
+        funcs = Primitives.setdefault(lexeme, {"compile": None, "execute": None})
         funcs["execute"] = func
-    Primitives[lexeme] = funcs
-    
-def compileTime(func) -> function:
+        if funcs["compile"] is None:
+            funcs["compile"] = lambda state: state.codes.append(lexeme)
+        return func
+    return register
+
+def compileTime(lexeme:str) -> Callable:
     """
-    Decorator to mark a primitive as having a non-default compile-time behavior.
+    Decorator which adds the compile-time behavior of a primitive word to the Primitives dictionary.
     """
-    func.__doc__ = func.__doc__ + " | (Function Implements Special Compile-Time Behavior)"
-    return func
+    def register(func):
+        Primitives.setdefault(lexeme, {"compile": None, "execute": None})["compile"] = func
+        return func
+    return register
 
-@primitive
+def isPrimitive(lexeme:str) -> bool:
+    """
+    True for built-in words. Words of optional word sets import their module here, at compile time,
+    so Primitives stays a plain dict for the interpret loops.
+    """
+    if lexeme in Primitives:
+        return True
+    if lexeme in WordSets:
+        importlib.import_module(WordSets[lexeme])
+        return True
+    return False
+
+def loadWordSets(codes:list) -> None:
+    """Imports the word sets of any codes that weren't compiled in this process, e.g. from a saved image."""
+    missing = WordSets.keys() - Primitives.keys()
+    if missing:
+        for lexeme in missing.intersection(code for code in codes if type(code) is str):
+            isPrimitive(lexeme)
+
+@primitive("+")
 def plus(state:InterpretState) -> None:
-    """Lexeme: +"""
     a, b = state.dataStack.pop(), state.dataStack.pop()
     state.dataStack.append(a + b)
     state.pos += 1
 
-@primitive
+@primitive("-")
 def minus(state:InterpretState) -> None:
-    """Lexeme: -"""
     a, b = state.dataStack.pop(), state.dataStack.pop()
     state.dataStack.append(b - a)
     state.pos += 1
 
-@primitive
+@primitive("*")
 def star(state:InterpretState) -> None:
-    """Lexeme: *"""
     a, b = state.dataStack.pop(), state.dataStack.pop()
     state.dataStack.append(a * b)
     state.pos += 1
 
-@primitive
+@primitive("/")
 def slash(state:InterpretState) -> None:
-    """Lexeme: /"""
     a, b = state.dataStack.pop(), state.dataStack.pop()
     state.dataStack.append(b // a)
     state.pos += 1
 
-@primitive
+@primitive("MOD")
 def mod(state:InterpretState) -> None:
-    """Lexeme: MOD"""
     a, b = state.dataStack.pop(), state.dataStack.pop()
     state.dataStack.append(b % a)
     state.pos += 1
 
-@primitive
+@primitive("/MOD")
 def slashMod(state:InterpretState) -> None:
-    """Lexeme: /MOD"""
     a, b = state.dataStack.pop(), state.dataStack.pop()
     state.dataStack.append(b % a)
     state.dataStack.append(b // a)
     state.pos += 1
 
-@primitive
+@primitive("<")
 def lessThan(state:InterpretState) -> None:
-    """Lexeme: <"""
     a, b = state.dataStack.pop(), state.dataStack.pop()
     if a < b:
         state.dataStack.append(-1)
@@ -83,9 +109,8 @@ def lessThan(state:InterpretState) -> None:
         state.dataStack.append(0)
     state.pos += 1
 
-@primitive
+@primitive(">")
 def greaterThan(state:InterpretState) -> None:
-    """Lexeme: >"""
     a, b = state.dataStack.pop(), state.dataStack.pop()
     if a > b:
         state.dataStack.append(-1)
@@ -93,9 +118,8 @@ def greaterThan(state:InterpretState) -> None:
         state.dataStack.append(0)
     state.pos += 1
 
-@primitive
+@primitive("=")
 def equal(state:InterpretState) -> None:
-    """Lexeme: ="""
     a, b = state.dataStack.pop(), state.dataStack.pop()
     if a == b:
         state.dataStack.append(-1)
@@ -103,58 +127,51 @@ def equal(state:InterpretState) -> None:
         state.dataStack.append(0)
     state.pos += 1
 
-@primitive
+@primitive("AND")
 def bitwiseAnd(state:InterpretState) -> None:
-    """Lexeme: AND"""
     a, b = state.dataStack.pop(), state.dataStack.pop()
     state.dataStack.append(a & b)
     state.pos += 1
 
-@primitive
+@primitive("OR")
 def bitwiseOr(state:InterpretState) -> None:
-    """Lexeme: OR"""
     a, b = state.dataStack.pop(), state.dataStack.pop()
     state.dataStack.append(a | b)
     state.pos += 1
 
-@primitive
+@primitive("INVERT")
 def bitwiseNot(state:InterpretState) -> None:
-    """Lexeme: INVERT"""
     a = state.dataStack.pop()
     state.dataStack.append(~a)
     state.pos += 1
 
-@primitive
+@primitive("SWAP")
 def swap(state:InterpretState) -> None:
-    """Lexeme: SWAP"""
     a, b = state.dataStack.pop(), state.dataStack.pop()
     state.dataStack.append(a)
     state.dataStack.append(b)
     state.pos += 1
 
-@primitive
+@primitive("DUP")
 def dup(state:InterpretState) -> None:
-    """Lexeme: DUP"""
     a = state.dataStack.pop()
     state.dataStack.append(a)
     state.dataStack.append(a)
     state.pos += 1
 
-@primitive
+@primitive("DROP")
 def drop(state:InterpretState) -> None:
-    """Lexeme: DROP"""
     state.dataStack.pop()
     state.pos += 1
 
-@primitive
+@primitive("OVER")
 def over(state:InterpretState) -> None:
-    """Lexeme: OVER"""
     state.dataStack.append(state.dataStack[-2])
     state.pos += 1
 
-@primitive
+@primitive("ROT")
 def rot(state:InterpretState) -> None:
-    """Lexeme: ROT
+    """
     ( n1 n2 n3 -- n2 n3 n1 )
     """
     a, b, c = state.dataStack.pop(), state.dataStack.pop(), state.dataStack.pop()
@@ -163,10 +180,9 @@ def rot(state:InterpretState) -> None:
     state.dataStack.append(c)
     state.pos += 1
 
-@primitive
+@primitive("2SWAP")
 def twoSwap(state:InterpretState) -> None:
     """
-    Lexeme: 2SWAP
     ( x1 x2 x3 x4 -- x3 x4 x1 x2 )
     """
     a, b, c, d = state.dataStack.pop(), state.dataStack.pop(), state.dataStack.pop(), state.dataStack.pop()
@@ -176,166 +192,153 @@ def twoSwap(state:InterpretState) -> None:
     state.dataStack.append(c)
     state.pos += 1
 
-@primitive
+@primitive("2OVER")
 def twoOver(state:InterpretState) -> None:
     """
-    Lexeme: 2OVER
     ( x1 x2 x3 x4 -- x1 x2 x3 x4 x1 x2 )
     """
     state.dataStack.append(state.dataStack[-4])
     state.dataStack.append(state.dataStack[-4])
     state.pos += 1
 
-@primitive
+@primitive("2DROP")
 def twoDrop(state:InterpretState) -> None:
     """
-    Lexeme: 2DROP
     ( x1 x2 x3 x4 -- x1 x2 )
     """
     state.dataStack.pop()
     state.dataStack.pop()
     state.pos += 1
 
-@primitive
+@primitive("KEY")
 def key(state:InterpretState) -> None:
-    """Lexeme: KEY"""
-    keypress = getch()
+    if state.input is None:
+        from getch import getch # Only needed, and only importable, when reading from a terminal.
+        keypress = getch()
+    else:
+        keypress = state.input.key()
     state.dataStack.append(ord(keypress))
     state.pos += 1
 
-@primitive
-def DEBUG(state:InterpretState) -> None:
-    """Lexeme: DEBUG"""
-    print(state.dataStack)
-    state.pos += 1
-
-@primitive
+@primitive(".")
 def period(state:InterpretState) -> None:
-    """Lexeme: ."""
-    print(state.dataStack.pop(), end='\n')
+    print(state.dataStack.pop(), end='\n', file=state.output)
     state.pos += 1
 
-@primitive
+@primitive("EMIT")
 def emit(state:InterpretState) -> None:
-    """Lexeme: EMIT"""
-    print(chr(state.dataStack.pop()))
+    print(chr(state.dataStack.pop()), file=state.output)
     state.pos += 1
 
-@primitive
+@primitive("CR")
 def cr(state:InterpretState) -> None:
-    """Lexeme: CR"""
-    print()
+    print(file=state.output)
     state.pos += 1
 
-@primitive
+@primitive(";")
 def semicolon(state:InterpretState) -> None:
-    """Lexeme: ;"""
     state.pos = state.branchStack.pop()
 
-@primitive 
-@compileTime
+@compileTime(";")
 def semicolon(state:CompileState) -> None:
-    """Lexeme: ;"""
     state.codes.append(";")
     state.last_return = len(state.codes)
-
-@primitive
-@compileTime
+    if state.definitionStart is not None and not state.branchStack:
+        # Only once every branch of the definition is resolved, so no run is lifted that a branch jumps into.
+        if state.optimize:
+            from optimizer import optimize
+            optimize(state, state.definitionStart, len(state.codes))
+        state.definitionStart = None
+
+@compileTime(":")
 def colon(state:CompileState) -> None:
-    """Lexeme: :"""
     word = state.tokens[state.pos+1]
     state.words[word] = len(state.codes)
+    state.memoized.pop(word, None)
+    state.deferred.pop(word, None)
+    state.foreignWords.pop(word, None)
+    if word in state.bindings:
+        # Late-bound callers go through the slot, so repointing it redefines them all.
+        state.slots[state.bindings[word]] = len(state.codes)
+    elif state.lateBinding:
+        state.bindings[word] = len(state.slots)
+        state.slots.append(len(state.codes))
+    state.latest = word
+    state.definitionStart = len(state.codes)
+    state.dictVersion += 1
     state.pos += 1
 
-@primitive
+@primitive("PUSH")
 def push(state:InterpretState) -> None:
-    """Lexeme: PUSH"""
     value = state.codes[state.pos+1]
     state.dataStack.append(value)
     state.pos += 2
 
-@primitive
-@compileTime
+@compileTime("PUSH")
 def push(state:CompileState) -> None:
-    """Lexeme: PUSH has no compile-time behavior"""
+    """Has no compile-time behavior."""
     return None
 
-@primitive
+@primitive("CALL")
 def call(state:InterpretState) -> None:
-    """Lexeme: CALL"""
     state.branchStack.append(state.pos + 2)
     state.pos = state.codes[state.pos+1]
 
-@primitive
-@compileTime
+@compileTime("CALL")
 def call(state:CompileState) -> None:
-    """Lexeme: CALL has no compile-time behavior"""
+    """Has no compile-time behavior."""
     return None
 
-@primitive
+@primitive("END")
 def end(state:InterpretState) -> None:
-    """Lexeme: END"""
     state.end = True
 
-@primitive
-@compileTime
+@compileTime("END")
 def end(state:CompileState) -> None:
-    """Lexeme: END has no compile-time behavior"""
+    """Has no compile-time behavior."""
     return None
 
-@primitive
+@primitive("IF")
 def prim_if(state:InterpretState) -> None:
-    """Lexeme: IF"""
     if state.dataStack.pop() == 0:
         state.pos = state.codes[state.pos+1]
     else:
         state.pos += 2
 
-@primitive
-@compileTime
+@compileTime("IF")
 def prim_if(state:CompileState) -> None:
-    """Lexeme: IF"""
     state.branchStack.append(len(state.codes) + 1)
     state.codes.extend(("IF", None))
 
-@primitive
+@primitive("ELSE")
 def prim_else(state:InterpretState) -> None:
-    """Lexeme: ELSE"""
     state.pos = state.codes[state.pos+1]
 
-@primitive
-@compileTime
+@compileTime("ELSE")
 def prim_else(state:CompileState) -> None:
-    """Lexeme: ELSE"""
     ifPos = state.branchStack.pop()
     state.codes[ifPos] = len(state.codes) + 2
     state.branchStack.append(len(state.codes) + 1)
     state.codes.extend(("ELSE", None))
 
-@primitive
-@compileTime
+@compileTime("THEN")
 def prim_then(state:CompileState) -> None:
-    """Lexeme: THEN"""
     elsePos = state.branchStack.pop()
     state.codes[elsePos] = len(state.codes)
 
-@primitive
+@primitive("DO")
 def do(state:InterpretState) -> None:
-    """Lexeme: DO"""
     a,b = state.dataStack.pop(), state.dataStack.pop()
     state.branchStack.extend((b,a))
     state.pos += 1
 
-@primitive
-@compileTime
+@compileTime("DO")
 def do(state:CompileState) -> None:
-    """Lexeme: DO"""
     state.branchStack.append(len(state.codes) + 1)
     state.codes.append("DO")
 
-@primitive
+@primitive("LOOP")
 def loop(state:InterpretState) -> None:
-    """Lexeme: LOOP"""
     a,b = state.branchStack.pop(), state.branchStack.pop()
     a += 1
     if a < b:
@@ -344,37 +347,245 @@ def loop(state:InterpretState) -> None:
     else:
         state.pos += 2
 
-@primitive
-@compileTime
+@compileTime("LOOP")
 def loop(state:CompileState) -> None:
-    """Lexeme: LOOP"""
     doPos = state.branchStack.pop()
     state.codes.extend(("LOOP", doPos))
+    if state.optimize:
+        from optimizer import unroll
+        unroll(state, doPos)
+
+@compileTime("BEGIN")
+def begin(state:CompileState) -> None:
+    state.branchStack.append(len(state.codes))
+
+@compileTime("UNTIL")
+def until(state:CompileState) -> None:
+    """( flag -- ) Branches back to BEGIN while flag is zero, using the IF code."""
+    beginPos = state.branchStack.pop()
+    state.codes.extend(("IF", beginPos))
+
+@compileTime("AGAIN")
+def again(state:CompileState) -> None:
+    """Branches back to BEGIN unconditionally, using the ELSE code."""
+    beginPos = state.branchStack.pop()
+    state.codes.extend(("ELSE", beginPos))
+
+@compileTime("WHILE")
+def prim_while(state:CompileState) -> None:
+    """( flag -- ) Leaves the loop when flag is zero. The exit is patched by REPEAT."""
+    beginPos = state.branchStack.pop()
+    state.branchStack.extend((len(state.codes) + 1, beginPos))
+    state.codes.extend(("IF", None))
 
-@primitive
-@compileTime
+@compileTime("REPEAT")
+def repeat(state:CompileState) -> None:
+    beginPos, whilePos = state.branchStack.pop(), state.branchStack.pop()
+    state.codes.extend(("ELSE", beginPos))
+    state.codes[whilePos] = len(state.codes)
+
+@compileTime("VARIABLE")
 def variable(state:CompileState) -> None:
-    """Lexeme: VARIABLE"""
     varName = state.tokens[state.pos+1]
     state.variables[varName] = len(state.variables)
+    state.dictVersion += 1
     state.pos += 1
 
-@primitive
+@primitive("@")
 def at(state:InterpretState) -> None:
-    """Lexeme: @"""
     a,b = state.dataStack.pop(), state.dataStack.pop()
     state.variables[a] = b
     state.pos += 1
 
-@primitive
+@primitive("!")
 def bang(state:InterpretState) -> None:
-    """Lexeme: !"""
     a = state.dataStack.pop()
     state.dataStack.append(state.variables[a])
     state.pos += 1
 
-@primitive
+@primitive("I")
 def I(state:InterpretState) -> None:
-    """Lexeme: I"""
     state.dataStack.append(state.branchStack[-1])
+    state.pos += 1
+
+@primitive("HERE")
+def here(state:InterpretState) -> None:
+    """
+    ( -- addr )
+    """
+    state.dataStack.append(len(state.dataSpace))
+    state.pos += 1
+
+@primitive("ALLOT")
+def allot(state:InterpretState) -> None:
+    """
+    ( n -- )
+    """
+    state.dataSpace.extend(bytes(state.dataStack.pop()))
+    state.pos += 1
+
+@primitive("C@")
+def cFetch(state:InterpretState) -> None:
+    """
+    ( c-addr -- char )
+    """
+    state.dataStack.append(state.dataSpace[state.dataStack.pop()])
+    state.pos += 1
+
+@primitive("C!")
+def cStore(state:InterpretState) -> None:
+    """
+    ( char c-addr -- )
+    """
+    a, b = state.dataStack.pop(), state.dataStack.pop()
+    state.dataSpace[a] = b & 0xFF
+    state.pos += 1
+
+def stringLiteral(state:CompileState, data:bytes) -> int:
+    """
+    Returns the data space address of a string literal, adding it to the pool on first use.
+    Identical literals share one copy.
+    """
+    if data not in state.strings:
+        state.strings[data] = len(state.dataSpace)
+        state.dataSpace.extend(data)
+    return state.strings[data]
+
+@compileTime('S"')
+def sQuote(state:CompileState) -> None:
+    """
+    ( -- c-addr u )
+    """
+    data = state.tokens[state.pos+1].encode()
+    state.codes.extend(('PUSH', stringLiteral(state, data), 'PUSH', len(data)))
+    state.pos += 1
+
+@compileTime('."')
+def dotQuote(state:CompileState) -> None:
+    """
+    ( -- )
+    """
+    data = state.tokens[state.pos+1].encode()
+    state.codes.extend(('PUSH', stringLiteral(state, data), 'PUSH', len(data), 'TYPE'))
+    state.pos += 1
+
+@compileTime('C"')
+def cQuote(state:CompileState) -> None:
+    """
+    ( -- c-addr )
+    """
+    data = state.tokens[state.pos+1].encode()
+    state.codes.extend(('PUSH', stringLiteral(state, bytes((len(data),)) + data)))
+    state.pos += 1
+
+@primitive("COUNT")
+def count(state:InterpretState) -> None:
+    """
+    ( c-addr1 -- c-addr2 u )
+    """
+    addr = state.dataStack.pop()
+    state.dataStack.extend((addr + 1, state.dataSpace[addr]))
+    state.pos += 1
+
+@primitive("TYPE")
+def prim_type(state:InterpretState) -> None:
+    """
+    ( c-addr u -- )
+    Decodes a view of the data space, so the whole string is printed with one write.
+    """
+    u, addr = state.dataStack.pop(), state.dataStack.pop()
+    with memoryview(state.dataSpace) as view:
+        print(str(view[addr:addr+u], 'utf-8', 'replace'), end='', file=state.output)
+    state.pos += 1
+
+@compileTime("(")
+def paren(state:CompileState) -> None:
+    """Skips to the closing ), or to the end of the input when there is none."""
+    while state.tokens[state.pos] != ')' and state.pos + 1 < len(state.tokens):
+        state.pos += 1
+
+def runWord(state:InterpretState, address:int) -> None:
+    """Runs a colon definition to completion from inside a primitive."""
+    returnTo, sentinel, ended = state.pos, -2 - len(state.branchStack), state.end
+    state.branchStack.append(sentinel)
+    state.pos, state.end = address, False
+    while state.pos != sentinel:
+        Primitives[state.codes[state.pos]]['execute'](state)
+        if state.end:
+            raise RuntimeError(f'code at {address} ran into the end of the program')
+    state.pos, state.end = returnTo, ended
+
+@primitive("XT")
+def xt(state:InterpretState) -> None:
+    state.dataStack.append(state.codes[state.pos+1])
+    state.pos += 2
+
+@compileTime("XT")
+def xt(state:CompileState) -> None:
+    """Has no compile-time behavior."""
+    return None
+
+@compileTime("'")
+def tick(state:CompileState) -> None:
+    """
+    ( -- xt )
+    An execution token is the code address of a colon definition.
+    """
+    word = state.tokens[state.pos+1]
+    if word in state.words:
+        state.codes.extend(('XT', state.words[word]))
+    else:
+        print("' needs a colon definition:", word, file=state.output)
+    state.pos += 1
+
+Primitives["[']"] = Primitives["'"]
+
+@primitive("EXECUTE")
+def execute(state:InterpretState) -> None:
+    """
+    ( xt -- )
+    """
+    state.branchStack.append(state.pos + 1)
+    state.pos = state.dataStack.pop()
+
+@compileTime("DEFER")
+def defer(state:CompileState) -> None:
+    """
+    Creates a word whose action is set at run time with IS.
+    Calls read the action from the word's slot, so nothing is looked up by name.
+    """
+    word = state.tokens[state.pos+1]
+    state.deferred[word] = len(state.slots)
+    state.slots.append(None)
+    state.dictVersion += 1
+    state.pos += 1
+
+@primitive("DEFERCALL")
+def deferCall(state:InterpretState) -> None:
+    target = state.slots[state.codes[state.pos+1]]
+    if target is None:
+        raise RuntimeError('deferred word has no action, set one with IS')
+    state.branchStack.append(state.pos + 2)
+    state.pos = target
+
+@compileTime("DEFERCALL")
+def deferCall(state:CompileState) -> None:
+    """Has no compile-time behavior."""
+    return None
+
+@primitive("IS")
+def prim_is(state:InterpretState) -> None:
+    """
+    ( xt -- )
+    """
+    state.slots[state.codes[state.pos+1]] = state.dataStack.pop()
+    state.pos += 2
+
+@compileTime("IS")
+def prim_is(state:CompileState) -> None:
+    word = state.tokens[state.pos+1]
+    if word in state.deferred:
+        state.codes.extend(('IS', state.deferred[word]))
+    else:
+        print('IS needs a deferred word:', word, file=state.output)
     state.pos += 1
\ No newline at end of file
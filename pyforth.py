@@ -1,18 +1,88 @@
 #! /usr/local/bin/python3
-import helpers, interpreter, argparse, readline # Readline magically makes input history work. 🙃🔫
+import sys, helpers, interpreter
 
-# Get command line arguments.
-parser = argparse.ArgumentParser(description='Forth Interpreter')
-parser.add_argument('file', nargs='?', type=argparse.FileType('r'))
-args = parser.parse_args()
+def parseArguments():
+    import argparse
+    parser = argparse.ArgumentParser(description='Forth Interpreter')
+    parser.add_argument('file', nargs='?', type=argparse.FileType('r'))
+    parser.add_argument('--prelude', type=argparse.FileType('r'), help='source compiled before anything else')
+    parser.add_argument('--input', type=argparse.FileType('rb'), help='read KEY, ACCEPT and REFILL input from this file, e.g. a recording')
+    parser.add_argument('--record', type=argparse.FileType('wb'), help='save all KEY, ACCEPT and REFILL input to this file for replay with --input')
+    parser.add_argument('--late-binding', action='store_true', help='let redefined words take effect in existing callers')
+    parser.add_argument('--pipeline', action='store_true', help='run file one definition at a time while the rest is still being read')
+    parser.add_argument('--optimize', action='store_true', help='unroll counted loops and compile pure stack code in colon definitions to Python')
+    parser.add_argument('--shake', metavar='IMAGE', help='compile file without running it and save only the code it uses to IMAGE')
+    parser.add_argument('--image', type=argparse.FileType('rb'), help='start from an image saved with --shake and run it')
+    parser.add_argument('--batch', metavar='DIR', help='run every .forth file in DIR in parallel')
+    parser.add_argument('--jobs', type=int, default=None, help='worker processes for --batch (default: all cores)')
+    parser.add_argument('--serve', metavar='ADDRESS', help='serve sessions on HOST:PORT or a Unix socket path')
+    parser.add_argument('--metrics', metavar='FILE', help='write runtime metrics to FILE at exit (JSON for .json, else Prometheus text)')
+    parser.add_argument('--memprofile', action='store_true', help='attribute memory to Forth words and print a report to stderr at exit')
+    parser.add_argument('--pool', type=int, default=8, help='pre-warmed interpreters kept ready for --serve')
+    return parser.parse_args()
 
-# Decide if we're reading from a file or stdin.
-if not bool(args.file):
-    forth = interpreter.Interpreter()
-    while True:
-        try: line = input('> ')
-        except (EOFError, KeyboardInterrupt): break
-        forth.run(helpers.tokenize(line))
+# Get command line arguments. A lone file name skips argparse, which costs more to import than the interpreter.
+if len(sys.argv) == 2 and not sys.argv[1].startswith('-'):
+    from types import SimpleNamespace
+    args = SimpleNamespace(file=open(sys.argv[1]), prelude=None, input=None, record=None, late_binding=False,
+                           pipeline=False, optimize=False, shake=None, image=None, batch=None, serve=None, metrics=None,
+                           memprofile=False)
 else:
-    forth = interpreter.Interpreter()
-    forth.run(helpers.tokenize(args.file.read()))
\ No newline at end of file
+    args = parseArguments()
+preludeSource = args.prelude.read() if args.prelude else ''
+
+if args.batch:
+    import batch
+    batch.report(batch.runBatch(args.batch, args.jobs, preludeSource))
+    raise SystemExit
+
+if args.serve:
+    import server
+    try: server.serve(args.serve, preludeSource, args.pool)
+    except KeyboardInterrupt: pass
+    raise SystemExit
+
+# Decide if we're reading from a file or stdin.
+forth = interpreter.Interpreter(lateBinding=args.late_binding, optimize=args.optimize,
+                                metrics=bool(args.metrics), memoryProfile=args.memprofile)
+if args.input or args.record or (args.file and not sys.stdin.isatty()):
+    import streams
+    if args.input:
+        source = streams.FileInput(args.input)
+    elif args.file and not sys.stdin.isatty():
+        source = streams.FileInput(sys.stdin.buffer) # Piped data, read in large chunks.
+    else:
+        source = streams.TerminalInput()
+    forth.interpretState.input = streams.RecordingInput(source, args.record) if args.record else source
+forth.run(helpers.tokenize(preludeSource))
+if args.image:
+    import pickle
+    source = forth.interpretState.input
+    forth.restore(pickle.load(args.image))
+    forth.interpretState.input = source
+    forth.run([])
+if args.shake:
+    import pickle, shake
+    forth.compile(forth.compileState, helpers.tokenize(args.file.read()) if args.file else [])
+    image, report = forth.shake()
+    with open(args.shake, 'wb') as file:
+        pickle.dump(image, file)
+    shake.printReport(report)
+    raise SystemExit
+try:
+    if not bool(args.file):
+        import readline # Readline magically makes input history work. 🙃🔫
+        while True:
+            try: line = input('> ')
+            except (EOFError, KeyboardInterrupt): break
+            forth.run(helpers.tokenize(line))
+    elif args.pipeline:
+        forth.runPipelined(args.file)
+    else:
+        forth.run(helpers.tokenize(args.file.read()))
+finally:
+    forth.close()
+    if args.metrics:
+        forth.dumpMetrics(args.metrics)
+    if args.memprofile:
+        forth.memoryReport(sys.stderr)
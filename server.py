@@ -0,0 +1,73 @@
+import os, queue, socketserver
+import helpers, interpreter
+from streams import StreamIO
+
+class InterpreterPool:
+    """
+    Hands out interpreters that already have the prelude compiled.
+    Returned interpreters are reset to the post-prelude state instead of being rebuilt.
+    """
+    def __init__(self, preludeSource:str='', size:int=8):
+        warm = interpreter.Interpreter()
+        warm.run(helpers.tokenize(preludeSource))
+        self.snapshot = warm.snapshot()
+        self.idle = queue.SimpleQueue()
+        for _ in range(size):
+            self.idle.put(warm.clone(self.snapshot))
+
+    def acquire(self) -> interpreter.Interpreter:
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            return interpreter.Interpreter().clone(self.snapshot)
+
+    def release(self, forth:interpreter.Interpreter) -> None:
+        forth.close()
+        forth.restore(self.snapshot)
+        self.idle.put(forth)
+
+class SessionHandler(socketserver.StreamRequestHandler):
+    """Runs each line received on the connection, sending output back over the socket."""
+    wbufsize = -1
+
+    def handle(self):
+        forth = self.server.pool.acquire()
+        stream = forth.interpretState.input = forth.interpretState.output = StreamIO(self.rfile, self.wfile)
+        try:
+            while True:
+                # Source lines and program input share one buffer, so ACCEPT and KEY read what follows the line.
+                line = stream.readLine()
+                if line is None:
+                    break
+                try:
+                    forth.run(helpers.tokenize(line.decode('utf-8', 'replace')))
+                except Exception as e:
+                    forth.abort(forth.interpretState)
+                    print('Error:', repr(e), file=forth.interpretState.output)
+                self.wfile.flush()
+        except (EOFError, ConnectionError):
+            pass
+        finally:
+            self.server.pool.release(forth)
+
+class TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+class UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def serve(address:str, preludeSource:str='', poolSize:int=8) -> None:
+    """
+    Serves Forth sessions on address, either HOST:PORT or the path of a Unix socket.
+    """
+    if ':' in address:
+        host, port = address.rsplit(':', 1)
+        server = TCPServer((host, int(port)), SessionHandler)
+    else:
+        if os.path.exists(address):
+            os.unlink(address)
+        server = UnixServer(address, SessionHandler)
+    server.pool = InterpreterPool(preludeSource, poolSize)
+    with server:
+        server.serve_forever()
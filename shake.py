@@ -0,0 +1,98 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from state import CompileState, InterpretState, Snapshot
+from primitives import Operands
+
+TARGETS = ('IF', 'ELSE', 'LOOP', 'CALL', 'XT', 'SPAWN', 'SUBMIT') # Codes whose operand is a code address.
+
+@dataclass
+class ShakeReport:
+    codesBefore: int
+    codesAfter: int
+    keptWords: list     = field(default_factory=list)
+    removedWords: list  = field(default_factory=list)
+
+def reachable(codes:list, entries:list, memos:list, slots:list, blocks:list) -> set:
+    """Start of every instruction that can run when execution begins at one of entries."""
+    pending, seen = list(entries), set()
+    while pending:
+        pos = pending.pop()
+        while pos not in seen:
+            seen.add(pos)
+            code = codes[pos]
+            if code in (';', 'END'):
+                break
+            if code == 'ELSE':
+                pending.append(codes[pos+1])
+                break
+            if code in TARGETS:
+                pending.append(codes[pos+1])
+            elif code == 'MEMOCALL':
+                pending.append(memos[codes[pos+1]].address)
+            elif code in ('DEFERCALL', 'IS') and slots[codes[pos+1]] is not None:
+                pending.append(slots[codes[pos+1]])
+            if code == 'BLOCK':
+                pos += blocks[codes[pos+1]].length
+            else:
+                pos += 1 + Operands.get(code, 0)
+    return seen
+
+def shake(compileState:CompileState, interpretState:InterpretState, roots=()) -> tuple:
+    """
+    Returns a Snapshot holding only the code reachable from the top-level code that hasn't run yet,
+    and from the words named in roots, with every code address relocated, plus a ShakeReport.
+    Variables, data space and slots are kept whole, since their indices appear in code as plain numbers.
+    The input and output streams are not kept.
+    """
+    from memo import MemoCache
+    from optimizer import Block
+    compileState, interpretState = Snapshot.capture(compileState, interpretState).restore()
+    codes, blocks = compileState.codes, compileState.blocks
+    entry = max(compileState.last_return, interpretState.pos)
+    entries = [entry, len(codes) - 1] + [compileState.words[name] for name in roots if name in compileState.words]
+    live = reachable(codes, entries, compileState.memos, compileState.slots, blocks)
+
+    # Copy the live instructions in order. BLOCK codes lose the LIFTED cells behind them.
+    moved, shaken, shakenBlocks = {}, [], []
+    for pos in sorted(live):
+        moved[pos] = len(shaken)
+        code = codes[pos]
+        if code == 'BLOCK':
+            shaken.extend(('BLOCK', len(shakenBlocks)))
+            shakenBlocks.append(Block(blocks[codes[pos+1]].source, 2))
+        else:
+            shaken.extend(codes[pos:pos + 1 + Operands.get(code, 0)])
+    pos = 0
+    while pos < len(shaken):
+        if shaken[pos] in TARGETS:
+            shaken[pos+1] = moved[shaken[pos+1]]
+        pos += 1 + Operands.get(shaken[pos], 0)
+
+    report = ShakeReport(len(codes), len(shaken))
+    for name, address in sorted(compileState.words.items()):
+        (report.keptWords if address in moved else report.removedWords).append(name)
+    words = {name: moved[address] for name, address in compileState.words.items() if address in moved}
+    memos = []
+    for memo in compileState.memos:
+        copy = MemoCache(memo.name, moved.get(memo.address), memo.inputs, memo.outputs, memo.size)
+        copy.results = memo.results.copy()
+        memos.append(copy)
+
+    compileState.codes = interpretState.codes = shaken
+    compileState.blocks = interpretState.blocks = shakenBlocks
+    compileState.memos = interpretState.memos = memos
+    compileState.slots[:] = [None if target is None else moved.get(target) for target in compileState.slots]
+    compileState.words = words
+    compileState.memoized = {name: index for name, index in compileState.memoized.items() if memos[index].address is not None}
+    compileState.latest = compileState.latest if compileState.latest in words else ''
+    compileState.last_return = interpretState.pos = moved[entry]
+    # Images are saved to disk, so they don't keep the streams of the interpreter they were shaken from.
+    interpretState.input = interpretState.output = compileState.output = None
+    return Snapshot.capture(compileState, interpretState), report
+
+def printReport(report:ShakeReport, file=None) -> None:
+    print(f'Kept {len(report.keptWords)} words, removed {len(report.removedWords)}: '
+          f'{report.codesBefore} -> {report.codesAfter} cells '
+          f'({100 * (1 - report.codesAfter / max(report.codesBefore, 1)):.0f}% smaller)', file=file)
+    if report.removedWords:
+        print('Removed:', ' '.join(report.removedWords), file=file)
@@ -0,0 +1,42 @@
+from collections import OrderedDict
+
+SNIPPET_CACHE_SIZE : int = 256 # Compiled snippets kept by Interpreter.evaluate before the least recently used is evicted.
+
+class NullOutput:
+    """Output stream that discards everything, used while evaluating."""
+    def write(self, text:str) -> None:
+        pass
+
+    def flush(self) -> None:
+        pass
+
+class SnippetCache:
+    """Bounded LRU cache of compiled snippets, keyed on source text. Entries compiled against an older dictionary miss."""
+    def __init__(self, size:int=SNIPPET_CACHE_SIZE):
+        self.size = size
+        self.addresses : OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, source:str, dictVersion:int):
+        try:
+            address, version = self.addresses[source]
+        except KeyError:
+            address, version = None, None
+        if version != dictVersion:
+            self.misses += 1
+            return None
+        self.addresses.move_to_end(source)
+        self.hits += 1
+        return address
+
+    def store(self, source:str, dictVersion:int, address:int) -> None:
+        self.addresses[source] = (address, dictVersion)
+        self.addresses.move_to_end(source)
+        if len(self.addresses) > self.size:
+            self.addresses.popitem(last=False)
+
+    @property
+    def hitRate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
@@ -1,4 +1,9 @@
-from dataclasses import dataclass, field
+from __future__ import annotations
+from array import array
+from dataclasses import dataclass, field, fields
+
+FLOAT_STACK_SIZE : int = 1024 # Cells preallocated for the float stack.
+SHARED_FIELDS = ('codes', 'dataSpace', 'memos', 'slots', 'foreign', 'blocks') # Objects the interpret state shares with the compile state.
 
 @dataclass
 class CompileState:
@@ -7,6 +12,25 @@ class CompileState:
     branchStack: list   = field(default_factory=list)
     variables: dict     = field(default_factory=dict)
     words: dict         = field(default_factory=dict)
+    dataSpace: bytearray = field(default_factory=bytearray)
+    strings: dict       = field(default_factory=dict)
+    memos: list         = field(default_factory=list)
+    memoized: dict      = field(default_factory=dict)
+    slots: list         = field(default_factory=list)
+    deferred: dict      = field(default_factory=dict)
+    bindings: dict      = field(default_factory=dict)
+    foreign: list       = field(default_factory=list) # Specialized callers of Python functions bound with Interpreter.bind.
+    foreignWords: dict  = field(default_factory=dict) # Name of each bound Python function to its index in foreign.
+    blocks: list        = field(default_factory=list) # optimizer.Block for each BLOCK code.
+    included: dict      = field(default_factory=dict) # Real path of every included file to its content hash.
+    includeFrames: list = field(default_factory=list)
+    latest: str         = ''
+    compileStart: int   = 0 # Code address where the current Interpreter.compile began, past code that may already have run.
+    definitionStart: int = None # Code address of the colon definition or evaluate snippet being compiled, None outside one.
+    lateBinding: bool   = False # Call words through their slot so redefinitions reach compiled callers.
+    optimize: bool      = False # Unroll counted loops and lift pure stack code in each colon definition to generated Python.
+    dictVersion: int    = 0 # Incremented whenever a word or variable is defined.
+    output: object      = None # Text stream for compiler messages, the interpret state's output during Interpreter.compile.
     pos: int            = 0
     last_return: int    = 0
     end: bool           = False
@@ -17,5 +41,70 @@ class InterpretState:
     dataStack: list     = field(default_factory=list)
     branchStack: list   = field(default_factory=list)
     variables: list     = field(default_factory=list)
+    floatStack: array   = field(default_factory=lambda: array('d', bytes(8 * FLOAT_STACK_SIZE)))
+    floatDepth: int     = 0
+    dataSpace: bytearray = field(default_factory=bytearray)
+    memos: list         = field(default_factory=list)
+    slots: list         = field(default_factory=list)
+    foreign: list       = field(default_factory=list)
+    blocks: list        = field(default_factory=list)
+    files: dict         = field(default_factory=dict)
+    input: object       = None # streams.InputSource or another object with key(), ready() and readLine(), or None for the terminal.
+    inputBuffer: int    = None # Data space address of the line buffer REFILL reads into, allotted on first use.
+    inputLength: int    = 0
+    output: object      = None # Text stream for printing words, or None for sys.stdout.
+    scheduler: object   = None # tasks.Scheduler, created by the first SPAWN.
     pos: int            = 0
-    end: bool           = False
\ No newline at end of file
+    end: bool           = False
+    paused: bool        = False
+    done: bool          = False
+
+
+def freeze(value):
+    """Copies a state field into a form the snapshot owns and never mutates."""
+    if isinstance(value, list):
+        return tuple(value)
+    if isinstance(value, bytearray):
+        return bytes(value)
+    if isinstance(value, dict):
+        return value.copy()
+    if isinstance(value, array):
+        return array(value.typecode, value)
+    return value
+
+def thaw(value):
+    """Makes a private mutable copy of a frozen field. Plain C-level copies only, no deep copying."""
+    if isinstance(value, tuple):
+        return list(value)
+    if isinstance(value, bytes):
+        return bytearray(value)
+    if isinstance(value, dict):
+        return value.copy()
+    if isinstance(value, array):
+        return array(value.typecode, value)
+    return value
+
+@dataclass(frozen=True)
+class Snapshot:
+    """
+    Point-in-time copy of an interpreter's compile and interpret state.
+    Open files and tasks are not captured; input and output objects and memo caches are shared.
+    """
+    compileFields: dict
+    interpretFields: dict
+
+    @classmethod
+    def capture(cls, compileState:CompileState, interpretState:InterpretState) -> Snapshot:
+        compileFields = {f.name: freeze(getattr(compileState, f.name)) for f in fields(CompileState)}
+        # Tokens before pos have already been compiled and are never looked at again.
+        compileFields['tokens'] = tuple(compileState.tokens[compileState.pos:])
+        compileFields['pos'] = 0
+        interpretFields = {f.name: freeze(getattr(interpretState, f.name)) for f in fields(InterpretState)
+                           if f.name not in SHARED_FIELDS + ('files', 'scheduler')}
+        return cls(compileFields, interpretFields)
+
+    def restore(self) -> tuple:
+        compileState = CompileState(**{name: thaw(value) for name, value in self.compileFields.items()})
+        interpretState = InterpretState(**{name: getattr(compileState, name) for name in SHARED_FIELDS},
+                                        **{name: thaw(value) for name, value in self.interpretFields.items()})
+        return compileState, interpretState
\ No newline at end of file
@@ -0,0 +1,191 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    import asyncio
+
+INPUT_CHUNK_SIZE : int = 65536 # Most bytes an input source reads at once.
+
+class InputPending(Exception):
+    """Raised by an input adapter when KEY has to wait for more data."""
+
+class InputSource:
+    """
+    Buffered input for KEY, KEY?, ACCEPT and REFILL. Subclasses implement read(), which returns
+    the next chunk of input or b'' at the end, and available(), which is True when read() won't block.
+    """
+    def __init__(self):
+        self.buffer = b''
+        self.pos = 0
+        self.eof = False
+
+    def read(self) -> bytes:
+        raise NotImplementedError
+
+    def available(self) -> bool:
+        return True
+
+    def fillBuffer(self) -> bool:
+        """Appends the next chunk to what is left of the buffer. False at the end of input."""
+        if self.eof:
+            return False
+        data = self.read()
+        if not data:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def key(self) -> str:
+        if self.pos == len(self.buffer) and not self.fillBuffer():
+            raise EOFError('input closed while waiting for KEY')
+        self.pos += 1
+        return chr(self.buffer[self.pos - 1])
+
+    def ready(self) -> bool:
+        """True when KEY would return without waiting."""
+        return self.pos < len(self.buffer) or (self.available() and self.fillBuffer())
+
+    def readLine(self):
+        """The next line as bytes without its line terminator, or None at the end of input."""
+        while True:
+            end = self.buffer.find(b'\n', self.pos)
+            if end != -1:
+                line, self.pos = self.buffer[self.pos:end], end + 1
+                break
+            if not self.fillBuffer():
+                if self.pos == len(self.buffer):
+                    return None
+                line, self.pos = self.buffer[self.pos:], len(self.buffer)
+                break
+        return line[:-1] if line.endswith(b'\r') else line
+
+class BytesInput(InputSource):
+    """Input from bytes in memory."""
+    def __init__(self, data:bytes):
+        super().__init__()
+        self.buffer = bytes(data)
+        self.eof = True
+
+class FileInput(InputSource):
+    """
+    Input from a binary file object: a file, a pipe such as sys.stdin.buffer, or a socket's reader.
+    Replaying a file saved by RecordingInput reproduces the recorded session.
+    """
+    def __init__(self, file):
+        super().__init__()
+        self.file = file
+        self.readChunk = getattr(file, 'read1', file.read) # read1 returns what a pipe has instead of waiting for a full chunk.
+
+    def read(self) -> bytes:
+        return self.readChunk(INPUT_CHUNK_SIZE)
+
+    def available(self) -> bool:
+        try:
+            fileno = self.file.fileno()
+        except (AttributeError, OSError, ValueError):
+            return True
+        import select
+        return bool(select.select([fileno], [], [], 0)[0])
+
+class TerminalInput(InputSource):
+    """Unbuffered keypresses from the terminal, and whole lines with echo for ACCEPT and REFILL."""
+    def read(self) -> bytes:
+        from getch import getch # Only needed, and only importable, when reading from a terminal.
+        return getch().encode()
+
+    def available(self) -> bool:
+        import select, sys
+        return bool(select.select([sys.stdin], [], [], 0)[0])
+
+    def readLine(self):
+        if self.pos < len(self.buffer):
+            return super().readLine()
+        import sys
+        line = sys.stdin.buffer.readline()
+        return line.rstrip(b'\r\n') if line else None
+
+class RecordingInput:
+    """Passes input through from source, saving every byte consumed to a binary file for replay with FileInput."""
+    def __init__(self, source, file):
+        self.source = source
+        self.file = file
+
+    def key(self) -> str:
+        keypress = self.source.key()
+        self.file.write(keypress.encode('latin-1'))
+        return keypress
+
+    def ready(self) -> bool:
+        return self.source.ready()
+
+    def readLine(self):
+        line = self.source.readLine()
+        if line is not None:
+            self.file.write(line + b'\n')
+        return line
+
+class StreamIO(FileInput):
+    """Connects the input words and the printing words to a pair of binary file objects, such as a socket's."""
+    def __init__(self, reader, writer):
+        super().__init__(reader)
+        self.writer = writer
+
+    def write(self, text:str) -> None:
+        self.writer.write(text.encode())
+
+    def flush(self) -> None:
+        self.writer.flush()
+
+class AsyncStreamIO:
+    """
+    Connects KEY and the printing words to an asyncio stream pair.
+    Output is buffered by the writer and drained between slices. KEY and ACCEPT raise
+    InputPending when not enough is buffered so the run loop can await more input.
+    """
+    def __init__(self, reader:asyncio.StreamReader, writer:asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.pending = bytearray()
+        self.eof = False
+
+    def key(self) -> str:
+        if not self.pending:
+            if self.eof:
+                raise EOFError('input closed while waiting for KEY')
+            raise InputPending()
+        keypress = chr(self.pending[0])
+        del self.pending[0]
+        return keypress
+
+    def ready(self) -> bool:
+        return bool(self.pending)
+
+    def readLine(self):
+        end = self.pending.find(b'\n')
+        if end == -1:
+            if not self.eof:
+                raise InputPending()
+            if not self.pending:
+                return None
+            end = len(self.pending)
+        line = bytes(self.pending[:end])
+        del self.pending[:end+1]
+        return line[:-1] if line.endswith(b'\r') else line
+
+    async def fill(self) -> None:
+        data = await self.reader.read(4096)
+        if not data:
+            if self.eof:
+                raise EOFError('input closed while waiting for KEY')
+            self.eof = True
+        self.pending.extend(data)
+
+    def write(self, text:str) -> None:
+        self.writer.write(text.encode())
+
+    def flush(self) -> None:
+        pass
+
+    async def drain(self) -> None:
+        await self.writer.drain()
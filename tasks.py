@@ -0,0 +1,78 @@
+from array import array
+from collections import deque
+from state import InterpretState, CompileState, SHARED_FIELDS
+from primitives import primitive, compileTime
+
+TASK_FLOAT_STACK_SIZE : int = 64 # Tasks get a smaller float stack so thousands of them stay cheap.
+TASK_EXIT : int = -1 # Return address of a task's word. codes[-1] is always the closing END.
+
+class Scheduler:
+    """
+    Round-robin scheduler shared by every task of one interpreter.
+    Tasks only switch when the running one executes PAUSE or waits in JOIN.
+    """
+    def __init__(self):
+        self.ready : deque = deque()
+        self.tasks : list = []
+
+    def spawn(self, state:InterpretState, address:int) -> int:
+        task = InterpretState(**{name: getattr(state, name) for name in SHARED_FIELDS}, variables=state.variables,
+                              files=state.files, input=state.input, output=state.output,
+                              floatStack=array('d', bytes(8 * TASK_FLOAT_STACK_SIZE)),
+                              branchStack=[TASK_EXIT], scheduler=self, pos=address)
+        self.tasks.append(task)
+        self.ready.append(task)
+        return len(self.tasks) - 1
+
+    def switch(self, task:InterpretState) -> InterpretState:
+        """Requeues a paused task (or retires a finished one) and returns the next task to run."""
+        if task.paused:
+            task.paused = task.end = False
+            self.ready.append(task)
+        else:
+            task.done = True
+        return self.ready.popleft()
+
+@primitive("SPAWN")
+def spawnWord(state:InterpretState) -> None:
+    """
+    ( -- task )
+    Starts the word named after SPAWN as a new task with its own stacks.
+    """
+    if state.scheduler is None:
+        state.scheduler = Scheduler()
+    state.dataStack.append(state.scheduler.spawn(state, state.codes[state.pos+1]))
+    state.pos += 2
+
+@compileTime("SPAWN")
+def spawnWord(state:CompileState) -> None:
+    word = state.tokens[state.pos+1]
+    if word in state.words:
+        state.codes.extend(('SPAWN', state.words[word]))
+    else:
+        print('SPAWN needs a colon definition:', word, file=state.output)
+    state.pos += 1
+
+@primitive("PAUSE")
+def pause(state:InterpretState) -> None:
+    """
+    ( -- )
+    Lets the next ready task run. Does nothing when no other task is waiting.
+    """
+    state.pos += 1
+    if state.scheduler is not None and state.scheduler.ready:
+        state.paused = state.end = True
+
+@primitive("JOIN")
+def join(state:InterpretState) -> None:
+    """
+    ( task -- )
+    Pauses until the task has returned from its word.
+    """
+    if state.scheduler is None or not 0 <= state.dataStack[-1] < len(state.scheduler.tasks):
+        raise RuntimeError(f'JOIN needs a task started with SPAWN, got {state.dataStack[-1]}')
+    if state.scheduler.tasks[state.dataStack[-1]].done:
+        state.dataStack.pop()
+        state.pos += 1
+    else:
+        state.paused = state.end = True
\ No newline at end of file